@@ -7,7 +7,6 @@ from typing import Optional, List, Dict, Any, AsyncGenerator
 from datetime import datetime
 import uuid
 import json
-import re
 
 from app.services.s3_config_loader import get_chatbot_config
 from app.services.bedrock_llm import get_bedrock_service
@@ -15,7 +14,7 @@ from app.services.athena import get_athena_service, AthenaQueryError
 from app.services.s3_client import get_s3_client_service
 from app.services.policy_engine import get_policy_engine
 from app.knowledge.schema_resolver import get_schema_resolver
-from app.utils.sql_utils import validate_sql, sanitize_sql, add_limit_clause
+from app.utils.sql_utils import SQL_CODE_BLOCK_RE, validate_sql, sanitize_sql, add_limit_clause
 from app.utils.result_utils import recommend_charts
 from app.models.chat import (
     QueryRequest, QueryResponse, QueryOptions, ResultPreview, 
@@ -114,7 +113,7 @@ class TextToSQLAgent:
     def _extract_sql(self, response: str) -> str:
         """Extract SQL query from LLM response."""
         # Try to find SQL in code blocks
-        code_block_match = re.search(r"```(?:sql)?\s*([\s\S]*?)```", response)
+        code_block_match = SQL_CODE_BLOCK_RE.search(response)
         if code_block_match:
             return code_block_match.group(1).strip()
         
@@ -126,11 +125,12 @@ class TextToSQLAgent:
         
         return sql
     
-    def _retrieve_schema(self, question: str, message_id: str) -> tuple:
+    async def _retrieve_schema(self, question: str, message_id: str) -> tuple:
         """Retrieve relevant database schema information."""
         self._emit_step(message_id, "retrieval", "🔍 Searching for relevant tables and columns...")
         
-        context = self.schema_resolver.resolve_schema_context(question)
+        # Off the event loop, so concurrent queries can share a vector search batch
+        context = await asyncio.to_thread(self.schema_resolver.resolve_schema_context, question)
         formatted = self.schema_resolver.format_schema_for_prompt(context)
         
         tables = [t.name for t in context.relevant_tables]
@@ -341,7 +341,7 @@ Provide a 2-3 sentence business summary focusing on key insights."""
             self._emit_step(message_id, "start", "🚀 Starting query processing...")
             
             # Step 1: Retrieve schema
-            schema_context, context = self._retrieve_schema(request.question, message_id)
+            schema_context, context = await self._retrieve_schema(request.question, message_id)
             
             # Extract table names for policy hints
             tables = [t.name for t in context.relevant_tables]
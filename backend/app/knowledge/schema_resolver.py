@@ -9,6 +9,12 @@ from app.models.schema import SchemaContext, TableInfo, ColumnInfo, RetrievedChu
 
 logger = logging.getLogger(__name__)
 
+# "Table: name" header in schema documentation chunks
+_TABLE_HEADER_RE = re.compile(r"Table:\s*(\w+)", re.IGNORECASE)
+
+# Column definitions like "- column_name (TYPE): description"
+_COLUMN_DEF_RE = re.compile(r"-\s+(\w+)\s+\(([^)]+)\)(?::\s*(.+))?", re.MULTILINE)
+
 
 class SchemaResolver:
     """Resolves schema information using vector store retrieval."""
@@ -69,11 +75,7 @@ class SchemaResolver:
             
             if not table_name:
                 # Try to parse from content
-                table_match = re.search(
-                    r"Table:\s*(\w+)",
-                    chunk.content,
-                    re.IGNORECASE
-                )
+                table_match = _TABLE_HEADER_RE.search(chunk.content)
                 if table_match:
                     table_name = table_match.group(1)
             
@@ -98,13 +100,7 @@ class SchemaResolver:
         """Parse column definitions from chunk content."""
         columns = []
         
-        # Pattern to match column definitions like "- column_name (TYPE): description"
-        column_pattern = re.compile(
-            r"-\s+(\w+)\s+\(([^)]+)\)(?::\s*(.+))?",
-            re.MULTILINE
-        )
-        
-        for match in column_pattern.finditer(content):
+        for match in _COLUMN_DEF_RE.finditer(content):
             name = match.group(1)
             data_type = match.group(2)
             description = match.group(3).strip() if match.group(3) else None
@@ -9,6 +9,8 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api import chat, schema, history, config, feedback
 from app.services.s3_config_loader import get_config_loader, get_chatbot_config
+from app.services.rlhf_store import close_rlhf_store
+from app.services.vector_store_client import get_vector_client
 from app.utils.logging_utils import setup_logging
 
 # Setup logging
@@ -37,10 +39,15 @@ async def lifespan(app: FastAPI):
     chatbot_config = get_chatbot_config()
     logger.info(f"Application: {chatbot_config.app_name} v{chatbot_config.version}")
     
+    # Create the vector client now so a FAISS index starts loading in the
+    # background instead of during the first request
+    get_vector_client()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down ClearSky Text-to-SQL API...")
+    close_rlhf_store()
 
 
 # Create FastAPI app
@@ -1,8 +1,9 @@
 """Feedback models for RLHF implementation."""
 
+from dataclasses import dataclass
 from enum import Enum
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Tuple
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 import uuid
 
@@ -13,6 +14,28 @@ class FeedbackType(str, Enum):
     THUMBS_DOWN = "thumbs_down"
 
 
+@dataclass(frozen=True)
+class FeedbackMetadata:
+    """SQL analysis stored with each feedback record."""
+    
+    __slots__ = ('tables', 'patterns', 'question_length', 'sql_length')
+    
+    tables: Tuple[str, ...]
+    patterns: Tuple[str, ...]
+    question_length: int
+    sql_length: int
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FeedbackMetadata":
+        """Build from a (possibly partial) metadata dict, e.g. older stored records."""
+        return cls(
+            tables=tuple(data.get("tables", ())),
+            patterns=tuple(data.get("patterns", ())),
+            question_length=int(data.get("question_length", 0)),
+            sql_length=int(data.get("sql_length", 0)),
+        )
+
+
 class FeedbackRecord(BaseModel):
     """A single feedback record from a user interaction."""
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -23,10 +46,22 @@ class FeedbackRecord(BaseModel):
     feedback_type: FeedbackType = Field(..., description="User feedback type")
     reason: Optional[str] = Field(default=None, description="Optional reason for feedback")
     timestamp: datetime = Field(default_factory=datetime.utcnow)
-    metadata: Dict[str, Any] = Field(
-        default_factory=dict,
+    metadata: FeedbackMetadata = Field(
+        default_factory=lambda: FeedbackMetadata.from_dict({}),
         description="Additional metadata (tables, patterns, etc.)"
     )
+    question_shingle_bits: int = Field(
+        default=0,
+        description="64-bit word signature of the question for fast similarity checks"
+    )
+    
+    @field_validator("metadata", mode="before")
+    @classmethod
+    def _coerce_metadata(cls, value: Any) -> Any:
+        """Accept plain dicts as stored in JSON and sent by older callers."""
+        if isinstance(value, dict):
+            return FeedbackMetadata.from_dict(value)
+        return value
     
     class Config:
         json_encoders = {
@@ -68,6 +103,11 @@ class PolicyHint(BaseModel):
     )
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    @property
+    def key(self) -> Tuple[str, frozenset, Optional[str]]:
+        """Identity used to merge hints: same type, table set and pattern."""
+        return (self.hint_type, frozenset(self.tables), self.pattern)
 
 
 class FeedbackStats(BaseModel):
@@ -72,6 +72,13 @@ class GRPOConfig(BaseModel):
         description="Minimum advantage to trigger policy update"
     )
     
+    max_concurrent_executions: int = Field(
+        default=4,
+        ge=1,
+        le=16,
+        description="Maximum SQL executions run concurrently when scoring a group"
+    )
+    
     # Storage
     storage_path: Optional[str] = Field(
         default=None,
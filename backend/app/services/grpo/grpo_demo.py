@@ -147,7 +147,7 @@ def run_step_by_step_demo():
     # Get a question to process
     if existing_feedback:
         test_question = existing_feedback[0].question
-        expected_tables = existing_feedback[0].metadata.get("tables", [])
+        expected_tables = existing_feedback[0].metadata.tables
     else:
         test_question = "Show total revenue by product"
         expected_tables = ["products", "orders"]
@@ -159,7 +159,7 @@ def run_step_by_step_demo():
     # Generate completions (simulated from existing data)
     completions = trainer.generate_group_simulated(
         test_question,
-        [f.model_dump() for f in existing_feedback] if existing_feedback else None
+        existing_feedback or None
     )
     
     print(f"  Generated {len(completions)} SQL completions:")
@@ -191,11 +191,11 @@ def run_step_by_step_demo():
     print("  │ #  │ Validity   │ Execution  │ Quality    │ Format     │ TOTAL   │")
     print("  ├────┼────────────┼────────────┼────────────┼────────────┼─────────┤")
     
-    for i, (total, breakdown) in enumerate(reward_results):
-        v = breakdown.get("sql_validity", {}).get("score", 0)
-        e = breakdown.get("execution_success", {}).get("score", 0)
-        q = breakdown.get("result_quality", {}).get("score", 0)
-        f = breakdown.get("format_quality", {}).get("score", 0)
+    for i, (total, _, scores) in enumerate(reward_results):
+        v = scores.get("sql_validity", 0)
+        e = scores.get("execution_success", 0)
+        q = scores.get("result_quality", 0)
+        f = scores.get("format_quality", 0)
         print(f"  │ {i+1}  │ {v:+.3f}     │ {e:+.3f}     │ {q:+.3f}     │ {f:+.3f}     │ {total:+.4f} │")
     
     print("  └────┴────────────┴────────────┴────────────┴────────────┴─────────┘")
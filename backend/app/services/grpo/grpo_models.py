@@ -1,6 +1,6 @@
 """GRPO Models - Data structures for GRPO training and analysis."""
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import uuid
@@ -9,6 +9,8 @@ import uuid
 class GRPOCompletion(BaseModel):
     """A single completion within a GRPO group."""
     
+    model_config = ConfigDict(frozen=True)
+    
     sql: str = Field(..., description="Generated SQL query")
     reward_breakdown: Dict[str, float] = Field(
         default_factory=dict,
@@ -29,6 +31,8 @@ class GRPOCompletion(BaseModel):
 class GRPOSample(BaseModel):
     """A complete GRPO training sample with G completions."""
     
+    model_config = ConfigDict(frozen=True)
+    
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     prompt: str = Field(..., description="User question/prompt")
     completions: List[GRPOCompletion] = Field(
@@ -98,11 +102,25 @@ class GRPOTrainingState(BaseModel):
     # Policy impact
     total_hints_created: int = Field(default=0)
     total_hints_updated: int = Field(default=0)
+    zero_variance_groups: int = Field(
+        default=0,
+        description="Groups skipped for policy updates because all rewards were identical"
+    )
     
     # Timestamps
     started_at: Optional[datetime] = None
     last_updated: datetime = Field(default_factory=datetime.utcnow)
     
+    # ISO string of last_updated, refreshed only when a step is added
+    _last_updated_iso: Optional[str] = PrivateAttr(default=None)
+    
+    @property
+    def last_updated_iso(self) -> str:
+        """Cached ISO-8601 form of last_updated."""
+        if self._last_updated_iso is None:
+            self._last_updated_iso = self.last_updated.isoformat()
+        return self._last_updated_iso
+    
     def add_step(self, step: GRPOStep, max_history: int = 10):
         """Add a training step and update aggregate metrics."""
         self.total_steps += 1
@@ -129,6 +147,7 @@ class GRPOTrainingState(BaseModel):
             self.recent_steps = self.recent_steps[-max_history:]
         
         self.last_updated = datetime.utcnow()
+        self._last_updated_iso = self.last_updated.isoformat()
 
 
 class GRPOVisualizationData(BaseModel):
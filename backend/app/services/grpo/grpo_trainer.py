@@ -16,10 +16,13 @@ As the saying goes:
 
 import logging
 import statistics
-from typing import Optional, List, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Iterable, Tuple
 from datetime import datetime
 import json
 
+import numpy as np
+
 from app.services.grpo.grpo_config import GRPOConfig
 from app.services.grpo.grpo_models import (
     GRPOCompletion, GRPOSample, GRPOStep, GRPOTrainingState, GRPOVisualizationData
@@ -28,6 +31,7 @@ from app.services.grpo.reward_functions import RewardFunctions, get_reward_funct
 from app.services.rlhf_store import RLHFStore, get_rlhf_store
 from app.services.policy_engine import PolicyEngine, get_policy_engine
 from app.models.feedback import PolicyHint, FeedbackType
+from app.utils.sql_utils import SQL_CODE_BLOCK_RE
 
 logger = logging.getLogger(__name__)
 
@@ -82,6 +86,7 @@ class GRPOTrainer:
         
         # Training state
         self.state = GRPOTrainingState(started_at=datetime.utcnow())
+        self._started_at_iso = self.state.started_at.isoformat()
         
         logger.info("GRPO Trainer initialized (policy-layer learning, no LLM retraining)")
     
@@ -118,6 +123,8 @@ class GRPOTrainer:
             List of G SQL query strings
         """
         G = num_samples or self.config.group_size
+        base_temperature = self.config.temperature_sampling
+        generate_text = self.bedrock_service.generate_text
         completions = []
         
         # Build the prompt
@@ -129,10 +136,10 @@ class GRPOTrainer:
         for i in range(G):
             try:
                 # Use varying temperature for diversity
-                temp = self.config.temperature_sampling + (i * 0.1)
+                temp = base_temperature + (i * 0.1)
                 temp = min(temp, 1.5)  # Cap temperature
                 
-                sql = self.bedrock_service.generate_text(
+                sql = generate_text(
                     prompt,
                     system_prompt="You are an expert SQL developer. Generate valid Presto SQL. Return ONLY the SQL query, no explanations.",
                     temperature=temp
@@ -151,7 +158,7 @@ class GRPOTrainer:
     def generate_group_simulated(
         self,
         question: str,
-        existing_feedback: List[Dict] = None
+        existing_feedback: Optional[Iterable[Any]] = None
     ) -> List[str]:
         """
         Generate simulated completions based on existing feedback data.
@@ -161,7 +168,8 @@ class GRPOTrainer:
         
         Args:
             question: User's natural language question
-            existing_feedback: Previous feedback records to use as basis
+            existing_feedback: Previous feedback records (FeedbackRecord
+                objects or plain dicts) to use as basis
             
         Returns:
             List of simulated SQL completions
@@ -171,7 +179,13 @@ class GRPOTrainer:
         
         # Check if we have existing feedback for similar questions
         if existing_feedback:
-            base_sqls = [f.get("sql", "") for f in existing_feedback if f.get("sql")]
+            base_sqls = [
+                sql for sql in (
+                    f.get("sql") if isinstance(f, dict) else getattr(f, "sql", None)
+                    for f in existing_feedback
+                )
+                if sql
+            ]
             
             for i in range(min(G, len(base_sqls))):
                 completions.append(base_sqls[i])
@@ -203,7 +217,7 @@ class GRPOTrainer:
         question: str,
         expected_tables: Optional[List[str]] = None,
         execute_queries: bool = False
-    ) -> List[Tuple[float, Dict[str, Any]]]:
+    ) -> List[Tuple[float, Dict[str, Any], Dict[str, float]]]:
         """
         Score each completion using reward functions.
         
@@ -216,26 +230,40 @@ class GRPOTrainer:
             execute_queries: Whether to actually execute SQL (expensive)
             
         Returns:
-            List of (total_reward, breakdown) tuples
+            List of (total_reward, breakdown, scores) tuples, where scores
+            maps each reward component to its raw score
         """
         results = []
         
-        for sql in completions:
-            execution_result = None
-            execution_error = None
-            
-            if execute_queries:
-                execution_result, execution_error = self._try_execute(sql)
-            
-            total, breakdown = self.reward_functions.compute_total_reward(
-                sql=sql,
-                question=question,
-                execution_result=execution_result,
-                execution_error=execution_error,
-                expected_tables=expected_tables
-            )
-            
-            results.append((total, breakdown))
+        if execute_queries and completions:
+            # Athena round-trips dominate, so run the group's queries concurrently
+            max_workers = min(len(completions), self.config.max_concurrent_executions)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                executions = list(executor.map(self._try_execute, completions))
+        else:
+            executions = [(None, None)] * len(completions)
+        
+        totals, breakdown = self.reward_functions.compute_total_reward_batch(
+            completions,
+            question,
+            execution_results=[result for result, _ in executions],
+            execution_errors=[error for _, error in executions],
+            expected_tables=expected_tables
+        )
+        
+        for i, total in enumerate(totals.tolist()):
+            completion_breakdown = {}
+            scores = {}
+            for name, component in breakdown.items():
+                score = float(component["scores"][i])
+                completion_breakdown[name] = {
+                    "score": score,
+                    "weight": component["weight"],
+                    "weighted": score * component["weight"],
+                    "details": component["details"][i],
+                }
+                scores[name] = score
+            results.append((total, completion_breakdown, scores))
         
         return results
     
@@ -265,25 +293,28 @@ class GRPOTrainer:
         if len(rewards) < 2:
             return [0.0] * len(rewards)
         
-        mean_reward = statistics.mean(rewards)
+        # Identical rewards carry no relative signal: every advantage is zero
+        if max(rewards) - min(rewards) < 1e-9:
+            return [0.0] * len(rewards)
+        
+        # NumPy reductions instead of statistics, which does exact
+        # (Fraction-based) arithmetic and is several times slower
+        values = np.asarray(rewards, dtype=np.float64)
+        mean_reward = values.mean()
         
         if self.config.scale_rewards:
-            std_reward = statistics.stdev(rewards)
+            std_reward = values.std(ddof=1)  # Sample std, as statistics.stdev
             if std_reward == 0:
                 std_reward = 1.0  # Avoid division by zero
         else:
             # Alternative: don't scale by std (avoids difficulty bias)
             std_reward = 1.0
         
-        advantages = []
-        for r in rewards:
-            adv = (r - mean_reward) / std_reward
-            
-            # Clip for stability
-            adv = max(-self.config.clip_advantage, min(self.config.clip_advantage, adv))
-            advantages.append(round(adv, 4))
+        # Clip for stability
+        clip = self.config.clip_advantage
+        advantages = np.clip((values - mean_reward) / std_reward, -clip, clip)
         
-        return advantages
+        return [round(adv, 4) for adv in advantages.tolist()]
     
     # =========================================================================
     # STEP 4: Update Policy Layer (NOT the LLM!)
@@ -321,46 +352,63 @@ class GRPOTrainer:
             "patterns_penalized": []
         }
         
-        # Analyze patterns from completions with positive advantages
-        positive_completions = sample.get_positive_advantage_completions()
+        threshold = self.config.min_advantage_threshold
+        extract_patterns = self.policy_engine.extract_sql_patterns
+        extract_tables = self.policy_engine.extract_tables_from_sql
+        add_hint = self.store.add_policy_hint
         
-        for completion in positive_completions:
-            if completion.advantage >= self.config.min_advantage_threshold:
-                # Extract patterns from this successful SQL
-                patterns = self.policy_engine.extract_sql_patterns(completion.sql)
-                tables = self.policy_engine.extract_tables_from_sql(completion.sql)
-                
-                for pattern in patterns:
-                    # Create or update a "prefer" hint
-                    hint = PolicyHint(
-                        hint_type="prefer",
-                        description=f"Pattern '{pattern}' performed well (advantage: {completion.advantage:.2f})",
-                        weight=min(1.0, 0.5 + (completion.advantage * lr)),
-                        tables=tables,
-                        pattern=pattern
-                    )
-                    self.store.add_policy_hint(hint)
-                    updates["hints_updated"] += 1
-                    updates["patterns_reinforced"].append(pattern)
-        
-        # Analyze patterns from completions with strong negative advantages
-        for completion in sample.completions:
-            if completion.advantage <= -self.config.min_advantage_threshold:
-                patterns = self.policy_engine.extract_sql_patterns(completion.sql)
-                tables = self.policy_engine.extract_tables_from_sql(completion.sql)
-                
-                for pattern in patterns:
-                    # Create "caution" hint for problematic patterns
-                    hint = PolicyHint(
-                        hint_type="caution",
-                        description=f"Pattern '{pattern}' underperformed (advantage: {completion.advantage:.2f})",
-                        weight=min(0.9, 0.5 + abs(completion.advantage) * lr),
-                        tables=tables,
-                        pattern=pattern
-                    )
-                    self.store.add_policy_hint(hint)
-                    updates["hints_created"] += 1
-                    updates["patterns_penalized"].append(pattern)
+        # Completions with strong positive/negative advantages
+        positive_completions = [
+            c for c in sample.get_positive_advantage_completions()
+            if c.advantage >= threshold
+        ]
+        negative_completions = [
+            c for c in sample.completions
+            if c.advantage <= -threshold
+        ]
+        
+        # Hint weights for the whole group in one vectorized pass
+        positive_weights = np.minimum(
+            1.0, 0.5 + np.array([c.advantage for c in positive_completions]) * lr
+        )
+        negative_weights = np.minimum(
+            0.9, 0.5 + np.abs(np.array([c.advantage for c in negative_completions])) * lr
+        )
+        
+        for completion, weight in zip(positive_completions, positive_weights.tolist()):
+            # Extract patterns from this successful SQL
+            patterns = extract_patterns(completion.sql)
+            tables = extract_tables(completion.sql)
+            
+            for pattern in patterns:
+                # Create or update a "prefer" hint
+                hint = PolicyHint(
+                    hint_type="prefer",
+                    description=f"Pattern '{pattern}' performed well (advantage: {completion.advantage:.2f})",
+                    weight=weight,
+                    tables=tables,
+                    pattern=pattern
+                )
+                add_hint(hint)
+                updates["hints_updated"] += 1
+                updates["patterns_reinforced"].append(pattern)
+        
+        for completion, weight in zip(negative_completions, negative_weights.tolist()):
+            patterns = extract_patterns(completion.sql)
+            tables = extract_tables(completion.sql)
+            
+            for pattern in patterns:
+                # Create "caution" hint for problematic patterns
+                hint = PolicyHint(
+                    hint_type="caution",
+                    description=f"Pattern '{pattern}' underperformed (advantage: {completion.advantage:.2f})",
+                    weight=weight,
+                    tables=tables,
+                    pattern=pattern
+                )
+                add_hint(hint)
+                updates["hints_created"] += 1
+                updates["patterns_penalized"].append(pattern)
         
         return updates
     
@@ -402,28 +450,34 @@ class GRPOTrainer:
         # Get existing feedback for simulation mode
         existing_feedback = None
         if use_simulation:
-            existing_feedback = [
-                r.model_dump() 
-                for r in self.store.get_all_feedback()
-            ]
+            existing_feedback = self.store.get_all_feedback()
+        
+        # STEPS 1-2: Generate each group and hand its reward scoring to a
+        # background worker, so scoring (and any query execution) for one
+        # question overlaps with generating the next question's group.
+        pending = []
+        with ThreadPoolExecutor(max_workers=1) as reward_executor:
+            for question in questions:
+                if self.config.verbose:
+                    logger.info(f"\n{'='*60}")
+                    logger.info(f"Processing: {question}")
+                    logger.info(f"{'='*60}")
+                
+                # STEP 1: Generate group
+                if use_simulation:
+                    completions = self.generate_group_simulated(question, existing_feedback)
+                else:
+                    completions = self.generate_group(question, schema_context)
+                
+                # STEP 2: Compute rewards (asynchronously)
+                tables = expected_tables.get(question, [])
+                reward_future = reward_executor.submit(
+                    self.compute_rewards, completions, question, tables, execute_queries
+                )
+                pending.append((question, completions, tables, reward_future))
         
-        for question in questions:
-            if self.config.verbose:
-                logger.info(f"\n{'='*60}")
-                logger.info(f"Processing: {question}")
-                logger.info(f"{'='*60}")
-            
-            # STEP 1: Generate group
-            if use_simulation:
-                completions = self.generate_group_simulated(question, existing_feedback)
-            else:
-                completions = self.generate_group(question, schema_context)
-            
-            # STEP 2: Compute rewards
-            tables = expected_tables.get(question, [])
-            reward_results = self.compute_rewards(
-                completions, question, tables, execute_queries
-            )
+        for question, completions, tables, reward_future in pending:
+            reward_results = reward_future.result()
             
             rewards = [r[0] for r in reward_results]
             all_rewards.extend(rewards)
@@ -431,36 +485,42 @@ class GRPOTrainer:
             # STEP 3: Compute advantages (THE GRPO MAGIC!)
             advantages = self.compute_advantages(rewards)
             
-            # Build sample with all data
-            grpo_completions = []
-            for i, (sql, (reward, breakdown)) in enumerate(zip(completions, reward_results)):
-                comp = GRPOCompletion(
+            # Build sample with all data. Inputs are trainer-internal and already
+            # typed, so skip Pydantic validation with model_construct.
+            grpo_completions = [
+                GRPOCompletion.model_construct(
                     sql=sql,
-                    reward_breakdown={k: v["score"] for k, v in breakdown.items()},
+                    reward_breakdown=scores,
                     total_reward=reward,
-                    advantage=advantages[i]
+                    advantage=advantage
                 )
-                grpo_completions.append(comp)
+                for sql, (reward, _, scores), advantage
+                in zip(completions, reward_results, advantages)
+            ]
             
             # Find best completion
             best_idx = rewards.index(max(rewards))
             
-            sample = GRPOSample(
+            sample = GRPOSample.model_construct(
                 prompt=question,
                 completions=grpo_completions,
-                mean_reward=statistics.mean(rewards) if rewards else 0,
-                std_reward=statistics.stdev(rewards) if len(rewards) > 1 else 0,
+                mean_reward=statistics.mean(rewards) if rewards else 0.0,
+                std_reward=statistics.stdev(rewards) if len(rewards) > 1 else 0.0,
                 best_completion_idx=best_idx,
-                tables_involved=tables,
+                tables_involved=list(tables),  # callers may pass tuples (FeedbackMetadata.tables)
                 patterns_found=self.policy_engine.extract_sql_patterns(
                     completions[best_idx] if completions else ""
                 )
             )
             
-            # STEP 4: Update policy layer
-            policy_updates = self.update_policy_layer(sample)
-            step.hints_created += policy_updates["hints_created"]
-            step.hints_updated += policy_updates["hints_updated"]
+            # STEP 4: Update policy layer (skipped for zero-variance groups,
+            # where no completion has any advantage signal)
+            if any(advantages):
+                policy_updates = self.update_policy_layer(sample)
+                step.hints_created += policy_updates["hints_created"]
+                step.hints_updated += policy_updates["hints_updated"]
+            else:
+                self.state.zero_variance_groups += 1
             
             step.samples.append(sample)
             
@@ -510,7 +570,8 @@ class GRPOTrainer:
         """
         # Load existing feedback
         feedback = self.store.get_all_feedback()
-        
+        expected_tables = {}
+
         if not feedback:
             logger.warning("No existing feedback found. Using synthetic data.")
             questions = [
@@ -519,14 +580,19 @@ class GRPOTrainer:
                 "Count orders by status"
             ]
         else:
-            questions = list(set(f.question for f in feedback))[:num_samples]
-        
-        # Get tables from feedback
-        expected_tables = {}
-        for f in feedback:
-            tables = f.metadata.get("tables", [])
-            if tables:
-                expected_tables[f.question] = tables
+            # Ordered dedup of questions, collecting their tables in the same
+            # pass. Later records still update the selected questions' tables
+            # (the most recent record with tables wins).
+            seen: Dict[str, None] = {}
+            for f in feedback:
+                if f.question not in seen:
+                    if len(seen) >= num_samples:
+                        continue
+                    seen[f.question] = None
+                tables = f.metadata.tables
+                if tables:
+                    expected_tables[f.question] = list(tables)
+            questions = list(seen)
         
         # Run GRPO step
         step = self.run_step(
@@ -553,8 +619,9 @@ class GRPOTrainer:
             "best_completion_rate": f"{self.state.best_completion_rate * 100:.1f}%",
             "hints_created": self.state.total_hints_created,
             "hints_updated": self.state.total_hints_updated,
-            "started_at": self.state.started_at.isoformat() if self.state.started_at else None,
-            "last_updated": self.state.last_updated.isoformat(),
+            "zero_variance_groups": self.state.zero_variance_groups,
+            "started_at": self._started_at_iso,
+            "last_updated": self.state.last_updated_iso,
         }
     
     # =========================================================================
@@ -577,10 +644,8 @@ Rules:
     
     def _extract_sql(self, response: str) -> str:
         """Extract SQL from LLM response."""
-        import re
-        
         # Try to find SQL in code blocks
-        code_block_match = re.search(r"```(?:sql)?\s*([\s\S]*?)```", response)
+        code_block_match = SQL_CODE_BLOCK_RE.search(response)
         if code_block_match:
             return code_block_match.group(1).strip()
         
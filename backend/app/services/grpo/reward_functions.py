@@ -8,12 +8,45 @@ This module implements reward functions that score SQL completions based on:
 """
 
 import logging
-import re
-from typing import Dict, Any, Optional, List, Tuple
+import string
+from functools import lru_cache
+import numpy as np
+from typing import Dict, Any, ClassVar, Optional, List, Set, Tuple
 from app.services.grpo.grpo_config import GRPOConfig
+from app.utils.sql_analysis import GOOD_PATTERNS, BAD_PATTERNS, analyze_sql
 
 logger = logging.getLogger(__name__)
 
+# Maps punctuation to spaces so keyword extraction is a translate + split.
+# Underscore is kept since identifiers like order_items count as one word.
+_PUNCT_CHARS = string.punctuation.replace('_', '') + '\u2018\u2019\u201c\u201d\u2013\u2014\u2026'
+_PUNCT_TABLE = str.maketrans(_PUNCT_CHARS, ' ' * len(_PUNCT_CHARS))
+
+# Common words ignored when extracting question keywords
+_STOP_WORDS = frozenset({
+    'show', 'me', 'get', 'find', 'list', 'all', 'the', 'a', 'an',
+    'of', 'in', 'for', 'with', 'by', 'from', 'to', 'and', 'or'
+})
+
+# Question words that call for an aggregate, and the SQL calls that provide one
+_AGGREGATE_QUESTION_KEYWORDS = ('total', 'sum', 'count', 'average', 'avg', 'max', 'min', 'how many')
+_AGGREGATE_SQL_CALLS = ('sum(', 'count(', 'avg(', 'max(', 'min(')
+
+
+@lru_cache(maxsize=8192)
+def _extract_keywords(text: str) -> Tuple[str, ...]:
+    """Cached keyword extraction; the question is reused across a whole group."""
+    # Remove common words
+    words = text.lower().translate(_PUNCT_TABLE).split()
+    return tuple(w for w in words if w not in _STOP_WORDS and len(w) > 2)
+
+
+@lru_cache(maxsize=8192)
+def _question_profile(question_lower: str) -> Tuple[Tuple[str, ...], bool]:
+    """Keywords and aggregation need of a question, computed once per group."""
+    needs_aggregation = any(kw in question_lower for kw in _AGGREGATE_QUESTION_KEYWORDS)
+    return _extract_keywords(question_lower), needs_aggregation
+
 
 class RewardFunctions:
     """
@@ -28,27 +61,15 @@ class RewardFunctions:
     """
     
     # SQL keywords for pattern detection
-    SQL_KEYWORDS = {
+    SQL_KEYWORDS: ClassVar[Set[str]] = {
         'SELECT', 'FROM', 'WHERE', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER',
         'GROUP', 'BY', 'ORDER', 'HAVING', 'LIMIT', 'OFFSET', 'UNION',
         'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'DROP', 'ALTER'
     }
     
-    # Best practice patterns (positive)
-    GOOD_PATTERNS = [
-        (r'CAST\s*\(', 'type_casting'),
-        (r'COALESCE\s*\(', 'null_handling'),
-        (r'AS\s+\w+', 'column_aliasing'),
-        (r'LIMIT\s+\d+', 'row_limiting'),
-        (r'ORDER\s+BY', 'result_ordering'),
-    ]
-    
-    # Anti-patterns (negative)
-    BAD_PATTERNS = [
-        (r'SELECT\s+\*', 'select_star'),  # SELECT * is often bad practice
-        (r'\w+\.\w+\.\w+', 'triple_prefix'),  # database.schema.table prefix
-        (r'--.*$', 'sql_comment'),  # Comments (might indicate confusion)
-    ]
+    # Best practice patterns (positive) and anti-patterns (negative)
+    GOOD_PATTERNS: ClassVar[List[Tuple[Any, str]]] = GOOD_PATTERNS
+    BAD_PATTERNS: ClassVar[List[Tuple[Any, str]]] = BAD_PATTERNS
     
     def __init__(self, config: Optional[GRPOConfig] = None):
         self.config = config or GRPOConfig()
@@ -76,26 +97,20 @@ class RewardFunctions:
         if not sql or not sql.strip():
             return -1.0, {"error": "Empty SQL query"}
         
-        sql_upper = sql.upper()
+        analysis = analyze_sql(sql)
         
         # Check for essential components
-        details["has_select"] = "SELECT" in sql_upper
-        details["has_from"] = "FROM" in sql_upper
+        details["has_select"] = analysis.has_select
+        details["has_from"] = analysis.has_from
         
         # Check balanced parentheses
-        open_parens = sql.count('(')
-        close_parens = sql.count(')')
-        details["balanced_parens"] = open_parens == close_parens
+        details["balanced_parens"] = analysis.balanced_parens
         
-        # Check for common syntax issues
-        # Unclosed quotes
-        single_quotes = sql.count("'")
-        double_quotes = sql.count('"')
-        details["no_syntax_errors"] = (single_quotes % 2 == 0) and (double_quotes % 2 == 0)
+        # Check for common syntax issues (unclosed quotes)
+        details["no_syntax_errors"] = analysis.balanced_quotes
         
         # Validate structure (SELECT ... FROM ...)
-        select_from_pattern = r'SELECT\s+.+\s+FROM\s+\w+'
-        details["valid_structure"] = bool(re.search(select_from_pattern, sql_upper, re.DOTALL))
+        details["valid_structure"] = analysis.valid_structure
         
         # Calculate score
         score = 0.0
@@ -134,7 +149,7 @@ class RewardFunctions:
         Returns:
             Tuple of (reward, details)
         """
-        details = {
+        details: Dict[str, Any] = {
             "executed": False,
             "has_results": False,
             "row_count": 0,
@@ -206,11 +221,12 @@ class RewardFunctions:
             "column_relevance": 0.0
         }
         
-        question_lower = question.lower()
-        sql_lower = sql.lower()
+        sql_lower = analyze_sql(sql).sql_lower
+        
+        # Question-side work is shared by every completion in the group
+        keywords, needs_aggregation = _question_profile(question.lower())
         
         # Check keyword relevance
-        keywords = self._extract_keywords(question_lower)
         matches = sum(1 for kw in keywords if kw in sql_lower)
         details["keyword_match"] = matches / max(len(keywords), 1)
         
@@ -222,11 +238,7 @@ class RewardFunctions:
             details["table_coverage"] = 0.5  # Neutral if no expected tables
         
         # Check for aggregate function usage based on question
-        aggregate_keywords = ['total', 'sum', 'count', 'average', 'avg', 'max', 'min', 'how many']
-        needs_aggregation = any(kw in question_lower for kw in aggregate_keywords)
-        has_aggregation = any(
-            agg in sql_lower for agg in ['sum(', 'count(', 'avg(', 'max(', 'min(']
-        )
+        has_aggregation = any(agg in sql_lower for agg in _AGGREGATE_SQL_CALLS)
         details["aggregation_match"] = (needs_aggregation == has_aggregation) or has_aggregation
         
         # Calculate score
@@ -250,26 +262,18 @@ class RewardFunctions:
         Returns:
             Tuple of (reward, details)
         """
-        details = {
-            "good_patterns": [],
-            "bad_patterns": [],
+        analysis = analyze_sql(sql)
+        
+        details: Dict[str, Any] = {
+            "good_patterns": list(analysis.good_patterns),
+            "bad_patterns": list(analysis.bad_patterns),
             "readability_score": 0.0
         }
         
-        # Check for good patterns
-        for pattern, name in self.GOOD_PATTERNS:
-            if re.search(pattern, sql, re.IGNORECASE):
-                details["good_patterns"].append(name)
-        
-        # Check for bad patterns
-        for pattern, name in self.BAD_PATTERNS:
-            if re.search(pattern, sql, re.IGNORECASE):
-                details["bad_patterns"].append(name)
-        
         # Readability heuristics
-        has_newlines = '\n' in sql
-        has_proper_casing = any(kw in sql for kw in ['SELECT', 'FROM', 'WHERE', 'JOIN'])
-        has_aliases = bool(re.search(r'\bAS\s+\w+', sql, re.IGNORECASE))
+        has_newlines = analysis.has_newlines
+        has_proper_casing = analysis.has_proper_casing
+        has_aliases = analysis.has_aliases
         
         readability = 0.0
         if has_proper_casing:
@@ -281,9 +285,9 @@ class RewardFunctions:
         details["readability_score"] = readability
         
         # Calculate score
-        good_score = min(len(details["good_patterns"]) * 0.2, 0.5)
-        bad_score = min(len(details["bad_patterns"]) * 0.2, 0.5)
-        readability_bonus = details["readability_score"] * 0.3
+        good_score = min(len(analysis.good_patterns) * 0.2, 0.5)
+        bad_score = min(len(analysis.bad_patterns) * 0.2, 0.5)
+        readability_bonus = readability * 0.3
         
         score = 0.5 + good_score + readability_bonus - bad_score
         
@@ -354,18 +358,66 @@ class RewardFunctions:
         
         return round(total, 4), breakdown
     
-    def _extract_keywords(self, text: str) -> List[str]:
-        """Extract meaningful keywords from text."""
-        # Remove common words
-        stop_words = {
-            'show', 'me', 'get', 'find', 'list', 'all', 'the', 'a', 'an', 
-            'of', 'in', 'for', 'with', 'by', 'from', 'to', 'and', 'or'
+    def compute_total_reward_batch(
+        self,
+        sqls: List[str],
+        question: str,
+        execution_results: Optional[List[Optional[Dict[str, Any]]]] = None,
+        execution_errors: Optional[List[Optional[str]]] = None,
+        expected_tables: Optional[List[str]] = None
+    ) -> Tuple[np.ndarray, Dict[str, Dict[str, Any]]]:
+        """
+        Compute weighted total rewards for a whole GRPO group at once.
+        
+        Per-completion string checks still run in Python, but the component
+        scores are combined with the weights in a single matrix product.
+        
+        Returns:
+            Tuple of (totals, breakdown)
+            - totals: array of N weighted total rewards
+            - breakdown: per component, the N scores, the weight and the
+              N details dicts
+        """
+        n = len(sqls)
+        execution_results = execution_results or [None] * n
+        execution_errors = execution_errors or [None] * n
+        
+        components = {
+            "sql_validity": [self.sql_validity_reward(sql) for sql in sqls],
+            "execution_success": [
+                self.execution_reward(sql, result, error)
+                for sql, result, error in zip(sqls, execution_results, execution_errors)
+            ],
+            "result_quality": [
+                self.result_quality_reward(sql, question, result, expected_tables)
+                for sql, result in zip(sqls, execution_results)
+            ],
+            "format_quality": [self.format_quality_reward(sql) for sql in sqls],
         }
         
-        words = re.findall(r'\b\w+\b', text.lower())
-        keywords = [w for w in words if w not in stop_words and len(w) > 2]
+        names = list(components)
+        scores = np.array(
+            [[score for score, _ in components[name]] for name in names],
+            dtype=np.float64
+        ).reshape(len(names), n)
+        weights = np.array([self.weights[name] for name in names], dtype=np.float64)
+        
+        totals = np.round(weights @ scores, 4)
+        
+        breakdown = {
+            name: {
+                "scores": scores[i],
+                "weight": self.weights[name],
+                "details": [details for _, details in components[name]],
+            }
+            for i, name in enumerate(names)
+        }
         
-        return keywords
+        return totals, breakdown
+    
+    def _extract_keywords(self, text: str) -> List[str]:
+        """Extract meaningful keywords from text."""
+        return list(_extract_keywords(text))
 
 
 # Singleton instance
@@ -0,0 +1,106 @@
+"""ONNX Embedder - Sentence embeddings with ONNX Runtime instead of PyTorch."""
+
+import logging
+import os
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Model files tried in order: a quantized export is preferred when present
+_MODEL_FILES = ("model_quantized.onnx", "model.onnx")
+
+
+class OnnxMiniLM:
+    """
+    Mean-pooled, L2-normalized sentence embeddings from an exported ONNX model.
+    
+    Expects a directory produced by an optimum export of a sentence-transformers
+    model (e.g. all-MiniLM-L6-v2), containing the ONNX model and tokenizer.json:
+    
+        optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 \\
+            --task feature-extraction --optimize O3 <model_dir>
+        optimum-cli onnxruntime quantize --onnx_model <model_dir> \\
+            --avx512_vnni -o <model_dir>
+    
+    encode() matches the subset of SentenceTransformer.encode used by the
+    vector store clients, so it can be swapped in for the PyTorch model.
+    """
+    
+    def __init__(self, model_dir: str, max_length: int = 256):
+        """
+        Load the ONNX model and tokenizer.
+        
+        Args:
+            model_dir: Directory with the exported model and tokenizer.json
+            max_length: Token limit per text; longer texts are truncated
+        
+        Raises:
+            FileNotFoundError: If no ONNX model is found in model_dir
+            ImportError: If onnxruntime or tokenizers is not installed
+        """
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        
+        directory = Path(model_dir)
+        model_path = next(
+            (directory / name for name in _MODEL_FILES if (directory / name).exists()),
+            None
+        )
+        if model_path is None:
+            raise FileNotFoundError(f"No ONNX model ({', '.join(_MODEL_FILES)}) in {model_dir}")
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = os.cpu_count() or 1
+        self._session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+        
+        self._tokenizer = Tokenizer.from_file(str(directory / "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.enable_padding()
+        
+        logger.info(f"Loaded ONNX embedding model from {model_path}")
+    
+    def encode(
+        self,
+        texts: Union[str, List[str]],
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = True
+    ) -> np.ndarray:
+        """
+        Embed texts.
+        
+        Args:
+            texts: Text or list of texts
+            convert_to_numpy: Accepted for SentenceTransformer compatibility;
+                results are always numpy arrays
+            normalize_embeddings: Scale embeddings to unit length
+        
+        Returns:
+            float32 array of shape (len(texts), dim), or (dim,) for a single text
+        """
+        single = isinstance(texts, str)
+        encodings = self._tokenizer.encode_batch([texts] if single else texts)
+        
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        
+        token_embeddings = self._session.run(None, feeds)[0]
+        
+        # Mean over real (non-padding) tokens
+        mask = attention_mask[:, :, None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        embeddings = (summed / np.clip(mask.sum(axis=1), 1e-9, None)).astype(np.float32)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        
+        return embeddings[0] if single else embeddings
+
@@ -1,17 +1,21 @@
 """Policy Engine - Transforms user feedback into actionable SQL generation hints."""
 
 import logging
-import re
 from typing import Optional, List, Dict, Set
 from datetime import datetime, timedelta
 
 from app.models.feedback import (
-    FeedbackRecord, FeedbackType, PolicyHint, FeedbackStats
+    FeedbackRecord, FeedbackMetadata, FeedbackType, PolicyHint, FeedbackStats
 )
 from app.services.rlhf_store import RLHFStore, get_rlhf_store
+from app.utils.question_signature import question_signature
+from app.utils.sql_analysis import SQL_PATTERNS, analyze_sql
 
 logger = logging.getLogger(__name__)
 
+# Estimated similarity above which the exact Jaccard score is computed
+_SIGNATURE_PREFILTER = 0.5
+
 
 class PolicyEngine:
     """
@@ -26,31 +30,7 @@ class PolicyEngine:
     NEGATIVE_THRESHOLD = 0.4  # Generate "avoid" hint if success rate below this
     POSITIVE_THRESHOLD = 0.8  # Generate "prefer" hint if success rate above this
     
-    # Common SQL patterns to track
-    SQL_PATTERNS = [
-        (r'GROUP\s+BY', 'GROUP BY'),
-        (r'JOIN\s+', 'JOIN'),
-        (r'LEFT\s+JOIN', 'LEFT JOIN'),
-        (r'INNER\s+JOIN', 'INNER JOIN'),
-        (r'CAST\s*\(', 'CAST'),
-        (r'COALESCE\s*\(', 'COALESCE'),
-        (r'CASE\s+WHEN', 'CASE WHEN'),
-        (r'ORDER\s+BY', 'ORDER BY'),
-        (r'HAVING\s+', 'HAVING'),
-        (r'DISTINCT\s+', 'DISTINCT'),
-        (r'COUNT\s*\(', 'COUNT'),
-        (r'SUM\s*\(', 'SUM'),
-        (r'AVG\s*\(', 'AVG'),
-        (r'MAX\s*\(', 'MAX'),
-        (r'MIN\s*\(', 'MIN'),
-        (r'WHERE\s+.*\s+IN\s*\(', 'WHERE IN'),
-        (r'WHERE\s+.*\s+LIKE\s+', 'WHERE LIKE'),
-        (r'WHERE\s+.*\s+BETWEEN\s+', 'WHERE BETWEEN'),
-        (r'LIMIT\s+\d+', 'LIMIT'),
-        (r'DATE_TRUNC', 'DATE_TRUNC'),
-        (r'TO_DATE', 'TO_DATE'),
-        (r'SUBSTRING', 'SUBSTRING'),
-    ]
+    SQL_PATTERNS = SQL_PATTERNS
     
     def __init__(self, store: Optional[RLHFStore] = None):
         """
@@ -71,22 +51,7 @@ class PolicyEngine:
         Returns:
             List of table names found in the query
         """
-        tables = set()
-        
-        # Match FROM and JOIN clauses
-        patterns = [
-            r'FROM\s+([a-zA-Z_][a-zA-Z0-9_]*)',
-            r'JOIN\s+([a-zA-Z_][a-zA-Z0-9_]*)',
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, sql, re.IGNORECASE)
-            for match in matches:
-                # Filter out common SQL keywords that might match
-                if match.upper() not in ('SELECT', 'WHERE', 'AND', 'OR', 'ON', 'AS'):
-                    tables.add(match.lower())
-        
-        return list(tables)
+        return list(analyze_sql(sql).tables)
     
     def extract_sql_patterns(self, sql: str) -> List[str]:
         """
@@ -98,13 +63,7 @@ class PolicyEngine:
         Returns:
             List of pattern names found
         """
-        patterns_found = []
-        
-        for pattern_regex, pattern_name in self.SQL_PATTERNS:
-            if re.search(pattern_regex, sql, re.IGNORECASE):
-                patterns_found.append(pattern_name)
-        
-        return patterns_found
+        return list(analyze_sql(sql).patterns)
     
     def record_feedback(
         self,
@@ -129,9 +88,8 @@ class PolicyEngine:
         Returns:
             The created feedback record
         """
-        # Extract metadata
-        tables = self.extract_tables_from_sql(sql)
-        patterns = self.extract_sql_patterns(sql)
+        # Extract metadata (one cached analysis pass)
+        analysis = analyze_sql(sql)
         
         # Create feedback record
         record = FeedbackRecord(
@@ -141,12 +99,13 @@ class PolicyEngine:
             sql=sql,
             feedback_type=feedback_type,
             reason=reason,
-            metadata={
-                "tables": tables,
-                "patterns": patterns,
-                "question_length": len(question),
-                "sql_length": len(sql),
-            }
+            question_shingle_bits=question_signature(question),
+            metadata=FeedbackMetadata(
+                tables=analysis.tables,
+                patterns=analysis.patterns,
+                question_length=len(question),
+                sql_length=len(sql),
+            )
         )
         
         # Save to store
@@ -155,9 +114,10 @@ class PolicyEngine:
         # Trigger policy update
         self._update_policies_from_feedback(record)
         
+        # Lazy %-formatting: the table/pattern lists are only rendered when INFO is enabled
         logger.info(
-            f"Recorded {feedback_type.value} feedback for message {message_id} "
-            f"(tables: {tables}, patterns: {patterns})"
+            "Recorded %s feedback for message %s (tables: %s, patterns: %s)",
+            feedback_type.value, message_id, analysis.tables, analysis.patterns,
         )
         
         return record
@@ -169,19 +129,15 @@ class PolicyEngine:
         Args:
             record: The new feedback record
         """
-        tables = record.metadata.get("tables", [])
-        patterns = record.metadata.get("patterns", [])
+        tables = record.metadata.tables
+        patterns = record.metadata.patterns
         
         # For negative feedback, analyze what might have gone wrong
         if record.feedback_type == FeedbackType.THUMBS_DOWN:
             # Check if this is a recurring issue with specific tables
             for table in tables:
-                table_feedback = self.store.get_feedback_for_tables([table])
-                negative_count = sum(
-                    1 for f in table_feedback 
-                    if f.feedback_type == FeedbackType.THUMBS_DOWN
-                )
-                total_count = len(table_feedback)
+                positive_count, negative_count = self.store.get_table_feedback_counts(table)
+                total_count = positive_count + negative_count
                 
                 if total_count >= self.MIN_FEEDBACK_FOR_HINT:
                     success_rate = 1 - (negative_count / total_count)
@@ -198,11 +154,7 @@ class PolicyEngine:
             
             # Check for pattern-specific issues
             for pattern in patterns:
-                pattern_feedback = self._get_feedback_by_sql_pattern(pattern)
-                negative_pattern_count = sum(
-                    1 for f in pattern_feedback 
-                    if f.feedback_type == FeedbackType.THUMBS_DOWN
-                )
+                _, negative_pattern_count = self.store.get_pattern_feedback_counts(pattern)
                 
                 if negative_pattern_count >= self.MIN_FEEDBACK_FOR_HINT:
                     hint = PolicyHint(
@@ -230,12 +182,8 @@ class PolicyEngine:
             if patterns and len(tables) > 0:
                 # Only create prefer hints for patterns that have good track records
                 for pattern in patterns:
-                    pattern_feedback = self._get_feedback_by_sql_pattern(pattern)
-                    positive_count = sum(
-                        1 for f in pattern_feedback 
-                        if f.feedback_type == FeedbackType.THUMBS_UP
-                    )
-                    total = len(pattern_feedback)
+                    positive_count, negative_count = self.store.get_pattern_feedback_counts(pattern)
+                    total = positive_count + negative_count
                     
                     if total >= self.MIN_FEEDBACK_FOR_HINT:
                         success_rate = positive_count / total
@@ -250,14 +198,6 @@ class PolicyEngine:
                             )
                             self.store.add_policy_hint(hint)
     
-    def _get_feedback_by_sql_pattern(self, pattern_name: str) -> List[FeedbackRecord]:
-        """Get feedback records that used a specific SQL pattern."""
-        all_feedback = self.store.get_all_feedback()
-        return [
-            f for f in all_feedback
-            if pattern_name in f.metadata.get("patterns", [])
-        ]
-    
     def get_policy_hints(
         self,
         question: str,
@@ -275,11 +215,15 @@ class PolicyEngine:
         """
         hints = self.store.get_hints_for_context(tables)
         
-        # Also check for question-pattern matches in recent negative feedback
-        recent_negative = [
-            r for r in self.store.get_recent_feedback(20)
-            if r.feedback_type == FeedbackType.THUMBS_DOWN
-        ]
+        # Also check for question-pattern matches in recent negative feedback.
+        # The store's signature estimate skips clearly dissimilar questions
+        # before the exact comparison.
+        recent_negative = self.store.get_recent_similar_feedback(
+            question,
+            limit=20,
+            min_estimate=_SIGNATURE_PREFILTER,
+            feedback_type=FeedbackType.THUMBS_DOWN,
+        )
         
         # Check for similar questions that failed
         for record in recent_negative:
@@ -289,7 +233,7 @@ class PolicyEngine:
                     hint_type="warning",
                     description=f"A similar question previously failed. Consider alternative approaches.",
                     weight=0.6,
-                    tables=record.metadata.get("tables", []),
+                    tables=record.metadata.tables,
                 )
                 hints.append(hint)
                 break  # Only add one such warning
@@ -361,35 +305,27 @@ class PolicyEngine:
     
     def analyze_and_update_policies(self) -> int:
         """
-        Run full policy analysis on all feedback data.
+        Run policy analysis on feedback data.
         
-        This can be called periodically to recalculate all policies.
+        This can be called periodically to recalculate policies. Only tables
+        with new feedback since the previous run are re-evaluated.
         
         Returns:
             Number of hints generated/updated
         """
-        all_feedback = self.store.get_all_feedback()
-        
-        if len(all_feedback) < self.MIN_FEEDBACK_FOR_HINT:
+        if self.store.get_feedback_count() < self.MIN_FEEDBACK_FOR_HINT:
             return 0
         
         hints_created = 0
         
-        # Analyze by table
-        table_stats: Dict[str, Dict[str, int]] = {}
-        for record in all_feedback:
-            for table in record.metadata.get("tables", []):
-                if table not in table_stats:
-                    table_stats[table] = {"up": 0, "down": 0}
-                if record.feedback_type == FeedbackType.THUMBS_UP:
-                    table_stats[table]["up"] += 1
-                else:
-                    table_stats[table]["down"] += 1
-        
-        for table, stats in table_stats.items():
-            total = stats["up"] + stats["down"]
+        # Analyze by table, using the store's incremental counts. Only tables
+        # that received feedback since the last analysis need re-evaluating.
+        table_stats = self.store.pop_dirty_table_counts()
+        
+        for table, (up_count, down_count) in table_stats.items():
+            total = up_count + down_count
             if total >= self.MIN_FEEDBACK_FOR_HINT:
-                success_rate = stats["up"] / total
+                success_rate = up_count / total
                 
                 if success_rate < self.NEGATIVE_THRESHOLD:
                     hint = PolicyHint(
@@ -1,22 +1,35 @@
 """RLHF Store - JSON-based persistent storage for feedback and policies."""
 
-import json
+import heapq
 import logging
+import mmap
 import os
-import re
+import queue
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Tuple
 from datetime import datetime
-from threading import Lock
+from threading import Event, Lock, Thread
 from filelock import FileLock
+import numpy as np
+import orjson
+from pydantic import ValidationError
 
 from app.models.feedback import (
     FeedbackRecord, FeedbackType, PolicyHint, PolicyState, FeedbackStats
 )
+from app.utils.question_signature import question_signature, estimated_similarities
+from app.utils.regex_utils import compile_untrusted_pattern
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=256)
+def _compile_sql_regex(pattern: str):
+    """Compile a case-insensitive SQL search regex, cached across calls."""
+    return compile_untrusted_pattern(pattern, ignore_case=True)
+
+
 class RLHFStore:
     """
     JSON-based persistent storage for RLHF feedback records and learned policies.
@@ -25,8 +38,11 @@ class RLHFStore:
     """
     
     DEFAULT_STORAGE_DIR = "rlhf_data"
-    FEEDBACK_FILE = "feedback_records.json"
+    FEEDBACK_FILE = "feedback_records.jsonl"  # Append-only, one record per line
+    LEGACY_FEEDBACK_FILE = "feedback_records.json"
     POLICY_FILE = "policy_state.json"
+    RECENT_NEGATIVES_LIMIT = 10  # Negative feedback listed in aggregated stats
+    WRITE_BATCH_SIZE = 256  # Records appended per write + fsync by the writer thread
     
     def __init__(self, storage_dir: Optional[str] = None):
         """
@@ -48,9 +64,53 @@ class RLHFStore:
         # In-memory cache
         self._feedback_cache: List[FeedbackRecord] = []
         self._policy_cache: Optional[PolicyState] = None
-        self._cache_loaded = False
+        # st_mtime_ns of the policy file the cache reflects, to pick up
+        # changes written by other processes (e.g. an offline trainer)
+        self._policy_mtime_ns: Optional[int] = None
+        
+        # Inverted indexes into _feedback_cache (positions, in insertion order)
+        # and per-key (thumbs_up, thumbs_down) counts, maintained on insert
+        self._by_pattern: Dict[str, List[int]] = {}
+        self._by_table: Dict[str, List[int]] = {}
+        self._pattern_counts: Dict[str, List[int]] = {}
+        self._table_counts: Dict[str, List[int]] = {}
+        
+        # First feedback position recorded for each message
+        self._by_message_id: Dict[str, int] = {}
+        
+        # Running totals behind get_aggregated_stats: votes, per-table votes
+        # (keyed by table name as stored) and a min-heap of the newest
+        # negative feedback as (timestamp, -position)
+        self._vote_counts = [0, 0]
+        self._stats_by_table: Dict[str, Dict[str, int]] = {}
+        self._recent_negatives: List[Tuple[datetime, int]] = []
+        
+        # Lower-cased table sets of policy hints, by hint id
+        self._hint_tables_lower: Dict[str, frozenset] = {}
+        
+        # Position in the policy state's hints of the first hint per PolicyHint.key
+        self._hint_positions: Dict[Tuple[str, frozenset, Optional[str]], int] = {}
+        
+        # Tables whose counts changed since the last policy analysis
+        self._dirty_tables: Set[str] = set()
+        
+        # Columnar copies of per-record fields (same positions as the cache),
+        # grown by doubling; only the first _column_size entries are valid
+        self._timestamps = np.zeros(0, dtype=np.float64)
+        self._question_bits = np.zeros(0, dtype=np.uint64)
+        self._feedback_types = np.zeros(0, dtype=np.int8)  # 0 = thumbs up, 1 = thumbs down
+        self._column_size = 0
+        # Set once the caches are populated; after that no call takes the lock to check
+        self._loaded = Event()
         self._memory_lock = Lock()
         
+        # Feedback records waiting to be appended by the background writer,
+        # plus Event markers (set once everything queued before them is on
+        # disk) and a None sentinel that stops the writer
+        self._write_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer: Optional[Thread] = None
+        self._writer_lock = Lock()
+        
         # Initialize files if they don't exist
         self._initialize_storage()
         
@@ -59,13 +119,18 @@ class RLHFStore:
     def _initialize_storage(self) -> None:
         """Create storage files if they don't exist."""
         if not self.feedback_file.exists():
-            self._write_json(self.feedback_file, {"records": []}, self.feedback_lock)
+            # Migrate records from the older single-document JSON format
+            legacy_file = self.storage_dir / self.LEGACY_FEEDBACK_FILE
+            records = []
+            if legacy_file.exists():
+                records = self._read_json(legacy_file, self.feedback_lock).get("records", [])
+                logger.info(f"Migrating {len(records)} feedback records from {legacy_file}")
+            self._write_jsonl(self.feedback_file, records, self.feedback_lock)
         
         if not self.policy_file.exists():
-            initial_policy = PolicyState()
-            self._write_json(
+            self._write_bytes(
                 self.policy_file, 
-                initial_policy.model_dump(mode='json'), 
+                PolicyState().model_dump_json().encode('utf-8'), 
                 self.policy_lock
             )
     
@@ -73,20 +138,38 @@ class RLHFStore:
         """Read JSON file with locking."""
         with lock:
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError) as e:
+                with open(file_path, 'rb') as f:
+                    return orjson.loads(f.read())
+            except (orjson.JSONDecodeError, FileNotFoundError) as e:
                 logger.error(f"Error reading {file_path}: {e}")
                 return {}
     
-    def _write_json(self, file_path: Path, data: Dict[str, Any], lock: FileLock) -> None:
-        """Write JSON file atomically with locking."""
+    def _read_policy_state(self) -> PolicyState:
+        """Read the policy file, validating the JSON bytes directly."""
+        with self.policy_lock:
+            try:
+                with open(self.policy_file, 'rb') as f:
+                    raw = f.read()
+            except FileNotFoundError as e:
+                logger.error(f"Error reading {self.policy_file}: {e}")
+                return PolicyState()
+        
+        if not raw.strip():
+            return PolicyState()
+        try:
+            return PolicyState.model_validate_json(raw)
+        except ValidationError as e:
+            logger.error(f"Error reading {self.policy_file}: {e}")
+            return PolicyState()
+    
+    def _write_bytes(self, file_path: Path, payload: bytes, lock: FileLock) -> None:
+        """Write a file atomically with locking."""
         with lock:
             # Write to temp file first, then rename (atomic on most systems)
             temp_file = file_path.with_suffix('.tmp')
             try:
-                with open(temp_file, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2, default=str)
+                with open(temp_file, 'wb') as f:
+                    f.write(payload)
                 temp_file.replace(file_path)
             except Exception as e:
                 logger.error(f"Error writing {file_path}: {e}")
@@ -94,29 +177,85 @@ class RLHFStore:
                     temp_file.unlink()
                 raise
     
+    def _read_feedback_records(self) -> List[FeedbackRecord]:
+        """
+        Load feedback records from the JSON Lines file.
+        
+        The file is memory-mapped and each line is validated straight from
+        bytes, so no intermediate text buffer or dicts are built. Lines that
+        fail to parse (e.g. a partial last line from an interrupted append)
+        are logged and skipped.
+        """
+        records = []
+        with self.feedback_lock:
+            try:
+                with open(self.feedback_file, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        return records  # mmap cannot map an empty file
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        size = len(mm)
+                        pos = 0
+                        line_number = 0
+                        while pos < size:
+                            end = mm.find(b"\n", pos)
+                            if end == -1:
+                                end = size
+                            line_number += 1
+                            line = mm[pos:end]
+                            pos = end + 1
+                            if not line.strip():
+                                continue
+                            try:
+                                records.append(FeedbackRecord.model_validate_json(line))
+                            except ValidationError as e:
+                                logger.error(
+                                    f"Skipping bad line {line_number} in {self.feedback_file}: {e}"
+                                )
+            except FileNotFoundError as e:
+                logger.error(f"Error reading {self.feedback_file}: {e}")
+        return records
+    
+    def _append_jsonl(self, file_path: Path, lines: List[bytes], lock: FileLock) -> None:
+        """Append serialized JSON documents as lines, with locking and one fsync."""
+        payload = b"\n".join(lines) + b"\n"
+        with lock:
+            with open(file_path, 'a+b') as f:
+                # Start on a fresh line if a previous append was cut short
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        payload = b"\n" + payload
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def _write_jsonl(self, file_path: Path, rows: List[Dict[str, Any]], lock: FileLock) -> None:
+        """Rewrite a JSON Lines file atomically with locking."""
+        payload = b"".join(orjson.dumps(row, default=str) + b"\n" for row in rows)
+        self._write_bytes(file_path, payload, lock)
+    
     def _load_cache(self) -> None:
         """Load data into memory cache."""
-        if self._cache_loaded:
-            return
-        
+        if not self._loaded.is_set():
+            self._load_cache_once()
+    
+    def _load_cache_once(self) -> None:
+        """Populate the caches from disk unless another thread already did."""
         with self._memory_lock:
-            if self._cache_loaded:  # Double-check after lock
+            # Another thread may have finished loading while we waited
+            if self._loaded.is_set():
                 return
             
             # Load feedback records
-            feedback_data = self._read_json(self.feedback_file, self.feedback_lock)
-            self._feedback_cache = [
-                FeedbackRecord(**r) for r in feedback_data.get("records", [])
-            ]
+            self._feedback_cache = self._read_feedback_records()
+            self._rebuild_indexes()
             
-            # Load policy state
-            policy_data = self._read_json(self.policy_file, self.policy_lock)
-            if policy_data:
-                self._policy_cache = PolicyState(**policy_data)
-            else:
-                self._policy_cache = PolicyState()
+            # Load policy state (stat first, so a write during the read is seen later)
+            self._policy_mtime_ns = self._policy_file_mtime_ns()
+            self._policy_cache = self._read_policy_state()
+            self._index_hints(self._policy_cache)
             
-            self._cache_loaded = True
+            self._loaded.set()
             logger.info(f"Loaded {len(self._feedback_cache)} feedback records from cache")
     
     def save_feedback(self, record: FeedbackRecord) -> None:
@@ -130,27 +269,184 @@ class RLHFStore:
         
         with self._memory_lock:
             self._feedback_cache.append(record)
+            self._index_record(len(self._feedback_cache) - 1, record)
         
-        # Persist to disk
-        feedback_data = {
-            "records": [r.model_dump(mode='json') for r in self._feedback_cache]
-        }
-        self._write_json(self.feedback_file, feedback_data, self.feedback_lock)
+        # Persisted by the writer thread; the record is already queryable
+        self._ensure_writer()
+        self._write_queue.put(record)
         
         logger.info(f"Saved feedback {record.id} ({record.feedback_type.value})")
     
+    def _ensure_writer(self) -> None:
+        """Start the background writer thread if it is not running."""
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = Thread(
+                    target=self._writer_loop, name="rlhf-feedback-writer", daemon=True
+                )
+                self._writer.start()
+    
+    def _writer_loop(self) -> None:
+        """
+        Append queued feedback records to the JSON Lines file.
+        
+        Blocks for the next item, then drains whatever else is queued (up
+        to WRITE_BATCH_SIZE records) so a burst of feedback costs one
+        write and one fsync. Write errors are logged and the batch dropped,
+        since the records stay available in memory.
+        """
+        while True:
+            items = [self._write_queue.get()]
+            records = 0
+            while records < self.WRITE_BATCH_SIZE:
+                try:
+                    item = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+                if isinstance(item, FeedbackRecord):
+                    records += 1
+            
+            lines = [
+                item.model_dump_json().encode('utf-8')
+                for item in items if isinstance(item, FeedbackRecord)
+            ]
+            if lines:
+                try:
+                    self._append_jsonl(self.feedback_file, lines, self.feedback_lock)
+                except Exception as e:
+                    logger.error(f"Failed to persist {len(lines)} feedback records: {e}")
+            
+            for item in items:
+                if isinstance(item, Event):
+                    item.set()
+            if any(item is None for item in items):
+                return
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every feedback record saved so far has been written.
+        
+        Args:
+            timeout: Maximum seconds to wait, or None to wait indefinitely
+        
+        Returns:
+            True if all pending records were written within the timeout
+        """
+        if self._writer is None:
+            return True
+        done = Event()
+        self._write_queue.put(done)
+        return done.wait(timeout)
+    
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Write any pending feedback records and stop the writer thread.
+        
+        Args:
+            timeout: Maximum seconds to wait for pending writes
+        """
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+        if writer is None:
+            return
+        self._write_queue.put(None)
+        writer.join(timeout)
+        if writer.is_alive():
+            logger.warning("RLHF feedback writer did not finish before shutdown")
+    
+    def _rebuild_indexes(self) -> None:
+        """Rebuild the pattern/table/message indexes from the feedback cache."""
+        self._by_pattern = {}
+        self._by_table = {}
+        self._by_message_id = {}
+        self._vote_counts = [0, 0]
+        self._stats_by_table = {}
+        self._recent_negatives = []
+        self._pattern_counts = {}
+        self._table_counts = {}
+        self._dirty_tables = set()
+        self._timestamps = np.zeros(len(self._feedback_cache), dtype=np.float64)
+        self._question_bits = np.zeros(len(self._feedback_cache), dtype=np.uint64)
+        self._feedback_types = np.zeros(len(self._feedback_cache), dtype=np.int8)
+        self._column_size = 0
+        for position, record in enumerate(self._feedback_cache):
+            self._index_record(position, record)
+    
+    def _index_record(self, position: int, record: FeedbackRecord) -> None:
+        """Add a cached record to the pattern/table/message indexes."""
+        vote = 0 if record.feedback_type == FeedbackType.THUMBS_UP else 1
+        
+        self._by_message_id.setdefault(record.message_id, position)
+        
+        self._vote_counts[vote] += 1
+        vote_key = "thumbs_up" if vote == 0 else "thumbs_down"
+        for table in record.metadata.tables:
+            counts = self._stats_by_table.get(table)
+            if counts is None:
+                counts = self._stats_by_table[table] = {"thumbs_up": 0, "thumbs_down": 0}
+            counts[vote_key] += 1
+        if vote == 1:
+            entry = (record.timestamp, -position)
+            if len(self._recent_negatives) < self.RECENT_NEGATIVES_LIMIT:
+                heapq.heappush(self._recent_negatives, entry)
+            else:
+                heapq.heappushpop(self._recent_negatives, entry)
+        
+        for pattern in set(record.metadata.patterns):
+            self._by_pattern.setdefault(pattern, []).append(position)
+            self._pattern_counts.setdefault(pattern, [0, 0])[vote] += 1
+        
+        for table in set(t.lower() for t in record.metadata.tables):
+            self._by_table.setdefault(table, []).append(position)
+            self._table_counts.setdefault(table, [0, 0])[vote] += 1
+            self._dirty_tables.add(table)
+        
+        if position >= len(self._timestamps):
+            capacity = max(16, 2 * len(self._timestamps))
+            self._timestamps = np.resize(self._timestamps, capacity)
+            self._question_bits = np.resize(self._question_bits, capacity)
+            self._feedback_types = np.resize(self._feedback_types, capacity)
+        self._timestamps[position] = record.timestamp.timestamp()
+        self._feedback_types[position] = vote
+        self._question_bits[position] = (
+            record.question_shingle_bits or question_signature(record.question)
+        )
+        self._column_size = position + 1
+    
+    def _recent_positions(self, limit: int) -> np.ndarray:
+        """Cache positions of the most recent records, newest first."""
+        timestamps = self._timestamps[:self._column_size]
+        if limit < len(timestamps):
+            # Timestamp of the limit-th newest record; ties at this cutoff
+            # are taken in insertion order, as a stable sort would
+            cutoff = -np.partition(-timestamps, limit - 1)[limit - 1]
+            newer = np.flatnonzero(timestamps > cutoff)
+            tied = np.flatnonzero(timestamps == cutoff)[:limit - len(newer)]
+            candidates = np.concatenate((newer, tied))
+        else:
+            candidates = np.arange(len(timestamps))
+        # Newest first; ties keep insertion order like a stable sort would
+        order = np.lexsort((candidates, -timestamps[candidates]))
+        return candidates[order]
+    
     def get_all_feedback(self) -> List[FeedbackRecord]:
         """Get all feedback records."""
         self._load_cache()
         return self._feedback_cache.copy()
     
+    def get_feedback_count(self) -> int:
+        """Get the number of stored feedback records."""
+        self._load_cache()
+        return len(self._feedback_cache)
+    
     def get_feedback_by_message_id(self, message_id: str) -> Optional[FeedbackRecord]:
         """Get feedback for a specific message."""
         self._load_cache()
-        for record in self._feedback_cache:
-            if record.message_id == message_id:
-                return record
-        return None
+        position = self._by_message_id.get(message_id)
+        return self._feedback_cache[position] if position is not None else None
     
     def get_feedback_for_tables(self, tables: List[str]) -> List[FeedbackRecord]:
         """
@@ -161,47 +457,109 @@ class RLHFStore:
         """
         self._load_cache()
         
-        matching = []
-        tables_set = set(t.lower() for t in tables)
+        positions = set()
+        for table in set(t.lower() for t in tables):
+            positions.update(self._by_table.get(table, ()))
         
-        for record in self._feedback_cache:
-            record_tables = set(
-                t.lower() for t in record.metadata.get("tables", [])
-            )
-            if record_tables & tables_set:  # Intersection
-                matching.append(record)
+        return [self._feedback_cache[i] for i in sorted(positions)]
+    
+    def get_feedback_by_sql_pattern(self, pattern_name: str) -> List[FeedbackRecord]:
+        """
+        Get feedback records whose metadata lists a named SQL pattern.
         
-        return matching
+        Args:
+            pattern_name: Pattern name as produced by the policy engine
+        """
+        self._load_cache()
+        return [self._feedback_cache[i] for i in self._by_pattern.get(pattern_name, ())]
+    
+    def get_pattern_feedback_counts(self, pattern_name: str) -> Tuple[int, int]:
+        """Get (thumbs_up, thumbs_down) counts for a named SQL pattern."""
+        self._load_cache()
+        up, down = self._pattern_counts.get(pattern_name, (0, 0))
+        return up, down
+    
+    def get_table_feedback_counts(self, table: str) -> Tuple[int, int]:
+        """Get (thumbs_up, thumbs_down) counts for a table."""
+        self._load_cache()
+        up, down = self._table_counts.get(table.lower(), (0, 0))
+        return up, down
     
     def get_feedback_by_pattern(self, pattern: str) -> List[FeedbackRecord]:
         """
         Get feedback records matching a SQL pattern.
         
         Args:
-            pattern: Regex pattern to match against SQL
+            pattern: Regex pattern to match against SQL (RE2 syntax when google-re2 is installed)
         """
         self._load_cache()
         
         matching = []
         try:
-            regex = re.compile(pattern, re.IGNORECASE)
+            regex = _compile_sql_regex(pattern)
             for record in self._feedback_cache:
                 if regex.search(record.sql):
                     matching.append(record)
-        except re.error as e:
+        except ValueError as e:
             logger.warning(f"Invalid pattern regex: {e}")
         
         return matching
     
+    def pop_dirty_table_counts(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Get (thumbs_up, thumbs_down) counts for tables that received feedback
+        since the last call, and reset the dirty set.
+        """
+        self._load_cache()
+        with self._memory_lock:
+            dirty = {
+                table: tuple(self._table_counts[table])
+                for table in sorted(self._dirty_tables)
+            }
+            self._dirty_tables = set()
+        return dirty
+    
     def get_recent_feedback(self, limit: int = 50) -> List[FeedbackRecord]:
         """Get most recent feedback records."""
         self._load_cache()
-        sorted_records = sorted(
-            self._feedback_cache, 
-            key=lambda r: r.timestamp, 
-            reverse=True
+        if limit <= 0:
+            return []
+        return [self._feedback_cache[i] for i in self._recent_positions(limit)]
+    
+    def get_recent_similar_feedback(
+        self,
+        question: str,
+        limit: int = 20,
+        min_estimate: float = 0.5,
+        feedback_type: Optional[FeedbackType] = None
+    ) -> List[FeedbackRecord]:
+        """
+        Get recent feedback whose question signature resembles a question.
+        
+        Compares 64-bit word signatures of the most recent records in one
+        vectorized pass; callers confirm matches with an exact comparison.
+        
+        Args:
+            question: Question to compare against
+            limit: Number of most recent records to consider
+            min_estimate: Keep records whose estimated similarity exceeds this
+            feedback_type: Only return records of this type (after taking the window)
+            
+        Returns:
+            Matching records, most recent first
+        """
+        self._load_cache()
+        if limit <= 0:
+            return []
+        positions = self._recent_positions(limit)
+        similarities = estimated_similarities(
+            self._question_bits[positions], question_signature(question)
         )
-        return sorted_records[:limit]
+        keep = similarities > min_estimate
+        if feedback_type is not None:
+            vote = 0 if feedback_type == FeedbackType.THUMBS_UP else 1
+            keep &= self._feedback_types[positions] == vote
+        return [self._feedback_cache[i] for i in positions[keep]]
     
     def get_aggregated_stats(self) -> FeedbackStats:
         """Calculate aggregated statistics from all feedback."""
@@ -213,43 +571,34 @@ class RLHFStore:
         if not self._feedback_cache:
             return stats
         
-        # Count by type
-        stats.thumbs_up_count = sum(
-            1 for r in self._feedback_cache 
-            if r.feedback_type == FeedbackType.THUMBS_UP
-        )
-        stats.thumbs_down_count = stats.total_feedback - stats.thumbs_up_count
+        # Counts are maintained incrementally as records are indexed
+        with self._memory_lock:
+            stats.thumbs_up_count, stats.thumbs_down_count = self._vote_counts
+            table_stats = {
+                table: dict(counts) for table, counts in self._stats_by_table.items()
+            }
+            # Newest first; equal timestamps keep insertion order
+            negative_feedback = [
+                self._feedback_cache[-negated_position]
+                for _, negated_position in sorted(self._recent_negatives, reverse=True)
+            ]
         
         # Success rate
         if stats.total_feedback > 0:
             stats.success_rate = stats.thumbs_up_count / stats.total_feedback
         
         # By table
-        table_stats: Dict[str, Dict[str, int]] = {}
-        for record in self._feedback_cache:
-            for table in record.metadata.get("tables", []):
-                if table not in table_stats:
-                    table_stats[table] = {"thumbs_up": 0, "thumbs_down": 0}
-                if record.feedback_type == FeedbackType.THUMBS_UP:
-                    table_stats[table]["thumbs_up"] += 1
-                else:
-                    table_stats[table]["thumbs_down"] += 1
         stats.feedback_by_table = table_stats
         
         # Recent patterns (last 10 negative feedback)
-        negative_feedback = [
-            r for r in self._feedback_cache 
-            if r.feedback_type == FeedbackType.THUMBS_DOWN
-        ]
-        negative_feedback.sort(key=lambda r: r.timestamp, reverse=True)
         stats.recent_patterns = [
             {
                 "question": r.question[:100],
                 "sql_snippet": r.sql[:200] if r.sql else "",
-                "tables": r.metadata.get("tables", []),
+                "tables": r.metadata.tables,
                 "reason": r.reason
             }
-            for r in negative_feedback[:10]
+            for r in negative_feedback
         ]
         
         # Active hints count
@@ -260,9 +609,39 @@ class RLHFStore:
     
     # Policy management
     
+    def _policy_file_mtime_ns(self) -> Optional[int]:
+        """Modification time of the policy file, or None if it is missing."""
+        try:
+            return os.stat(self.policy_file).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def _refresh_policy_cache(self) -> None:
+        """Reload the policy state if the file changed since it was cached."""
+        mtime_ns = self._policy_file_mtime_ns()
+        if mtime_ns == self._policy_mtime_ns:
+            return
+        
+        state = self._read_policy_state()
+        with self._memory_lock:
+            self._policy_cache = state
+            self._index_hints(state)
+            self._policy_mtime_ns = mtime_ns
+        logger.info(f"Reloaded policy state v{state.version} changed on disk")
+    
+    def _write_policy_file(self, state: PolicyState) -> None:
+        """Persist the policy state and remember the mtime of our own write."""
+        self._write_bytes(
+            self.policy_file, 
+            state.model_dump_json().encode('utf-8'), 
+            self.policy_lock
+        )
+        self._policy_mtime_ns = self._policy_file_mtime_ns()
+    
     def get_policy_state(self) -> PolicyState:
-        """Get the current policy state."""
+        """Get the current policy state, reloading it if the file changed."""
         self._load_cache()
+        self._refresh_policy_cache()
         return self._policy_cache or PolicyState()
     
     def save_policy_state(self, state: PolicyState) -> None:
@@ -274,27 +653,38 @@ class RLHFStore:
         
         with self._memory_lock:
             self._policy_cache = state
+            self._index_hints(state)
         
-        self._write_json(
-            self.policy_file, 
-            state.model_dump(mode='json'), 
-            self.policy_lock
-        )
+        self._write_policy_file(state)
         
         logger.info(f"Saved policy state v{state.version} with {len(state.hints)} hints")
     
+    def _index_hints(self, state: PolicyState) -> None:
+        """Rebuild the per-hint caches for a newly loaded or saved policy state."""
+        # Keep cached table sets only for hints still in the state
+        self._hint_tables_lower = {
+            hint.id: self._hint_tables_lower.get(hint.id)
+            or frozenset(t.lower() for t in hint.tables)
+            for hint in state.hints
+        }
+        self._hint_positions = {}
+        for i, hint in enumerate(state.hints):
+            self._hint_positions.setdefault(hint.key, i)
+    
     def add_policy_hint(self, hint: PolicyHint) -> None:
         """Add or update a policy hint."""
         state = self.get_policy_state()
         
-        # Check if similar hint exists (same type and tables)
-        existing_idx = None
-        for i, existing in enumerate(state.hints):
-            if (existing.hint_type == hint.hint_type and 
-                set(existing.tables) == set(hint.tables) and
-                existing.pattern == hint.pattern):
-                existing_idx = i
-                break
+        # Check if similar hint exists (same type, tables and pattern)
+        key = hint.key
+        existing_idx = self._hint_positions.get(key)
+        if existing_idx is not None and (
+            existing_idx >= len(state.hints) or state.hints[existing_idx].key != key
+        ):
+            # The state was modified without being saved; reindex it
+            with self._memory_lock:
+                self._index_hints(state)
+            existing_idx = self._hint_positions.get(key)
         
         if existing_idx is not None:
             # Update existing hint
@@ -330,30 +720,33 @@ class RLHFStore:
             if hint.weight < min_weight:
                 continue
             
-            hint_tables = set(t.lower() for t in hint.tables)
+            hint_tables = self._hint_tables_lower.get(hint.id)
+            if hint_tables is None:
+                hint_tables = frozenset(t.lower() for t in hint.tables)
+                self._hint_tables_lower[hint.id] = hint_tables
             
             # Include if: tables overlap OR hint has no specific tables (general hint)
             if not hint_tables or hint_tables & tables_set:
                 relevant_hints.append(hint)
         
-        # Sort by weight descending
-        relevant_hints.sort(key=lambda h: h.weight, reverse=True)
-        
-        return relevant_hints[:10]  # Limit to top 10 hints
+        # Top 10 hints by weight (same order as a stable descending sort)
+        return heapq.nlargest(10, relevant_hints, key=lambda h: h.weight)
     
     def clear_all_data(self) -> None:
         """Clear all stored data (for testing)."""
+        # Queued appends must land before the rewrite, not after it
+        self.flush()
+        
         with self._memory_lock:
             self._feedback_cache = []
+            self._rebuild_indexes()
             self._policy_cache = PolicyState()
-            self._cache_loaded = True
+            self._hint_tables_lower = {}
+            self._hint_positions = {}
+            self._loaded.set()
         
-        self._write_json(self.feedback_file, {"records": []}, self.feedback_lock)
-        self._write_json(
-            self.policy_file, 
-            PolicyState().model_dump(mode='json'), 
-            self.policy_lock
-        )
+        self._write_jsonl(self.feedback_file, [], self.feedback_lock)
+        self._write_policy_file(PolicyState())
         
         logger.info("Cleared all RLHF data")
 
@@ -368,3 +761,9 @@ def get_rlhf_store() -> RLHFStore:
     if _rlhf_store is None:
         _rlhf_store = RLHFStore()
     return _rlhf_store
+
+
+def close_rlhf_store() -> None:
+    """Flush pending feedback writes of the singleton store, if one was created."""
+    if _rlhf_store is not None:
+        _rlhf_store.close()
@@ -1,45 +1,151 @@
 """S3 Client Service - Upload results and generate presigned URLs."""
 
+import gzip
 import io
-import csv
-import json
 import logging
-from typing import Optional, List, Any
+import time
+from threading import Lock
+from typing import Optional, List, Any, Dict, NamedTuple, Tuple
 from datetime import datetime
-import uuid
 
-import boto3
+import orjson
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
-from app.services.s3_config_loader import get_chatbot_config
+from app.services.s3_config_loader import get_chatbot_config, get_config_loader
 from app.models.chat import ResultPreview
+from app.utils.aws_session import get_s3_client
+from app.utils.result_utils import result_to_csv
 
 logger = logging.getLogger(__name__)
 
+# Result files above the threshold are uploaded as parallel multipart chunks
+_RESULT_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+)
+
+# Result bodies at least this large are stored gzip-compressed. Keys keep
+# their .csv/.json names: with Content-Encoding set, browsers and HTTP
+# clients decompress the download transparently.
+_GZIP_MIN_BYTES = 1024
+_GZIP_LEVEL = 1  # Fastest level; tabular text still compresses several-fold
+
+# Presigned URLs are reused while at least this fraction of their lifetime remains
+_PRESIGNED_URL_MIN_REMAINING = 0.5
+_PRESIGNED_URL_CACHE_SIZE = 4096
+
+# (epoch second, "YYYYmmdd_HHMMSS") of the last result file timestamp
+_file_timestamp: Tuple[int, str] = (-1, "")
+
+
+def _utc_file_timestamp() -> str:
+    """
+    Current UTC time as YYYYmmdd_HHMMSS for result file names.
+    
+    The string is rebuilt at most once per second; uploads within the same
+    second reuse it instead of formatting a datetime each time.
+    """
+    global _file_timestamp
+    second = int(time.time())
+    cached_second, cached = _file_timestamp
+    if second == cached_second:
+        return cached
+    t = time.gmtime(second)
+    formatted = (
+        f"{t.tm_year:04d}{t.tm_mon:02d}{t.tm_mday:02d}_"
+        f"{t.tm_hour:02d}{t.tm_min:02d}{t.tm_sec:02d}"
+    )
+    _file_timestamp = (second, formatted)
+    return formatted
+
+
+class _ResultSettings(NamedTuple):
+    """Config values used by every result operation, read once per config load."""
+    bucket: str
+    prefix: str
+    presigned_url_expiry: int
+    region: str
+
 
 class S3ClientService:
     """Service for S3 operations related to query results."""
     
     def __init__(self):
         self._client = None
+        # (bucket, key, expiry) -> (url, reuse deadline on the monotonic clock)
+        self._url_cache: Dict[Tuple[str, str, int], Tuple[str, float]] = {}
+        self._url_cache_lock = Lock()
+        self._settings: Optional[_ResultSettings] = None
+        get_config_loader().add_reload_listener(self._invalidate_settings)
     
     @property
     def config(self):
         """Get current S3 configuration."""
         return get_chatbot_config().s3
     
+    @property
+    def settings(self) -> _ResultSettings:
+        """Bucket, prefix, URL expiry and region, cached until configs are reloaded."""
+        settings = self._settings
+        if settings is None:
+            config = get_chatbot_config()
+            settings = _ResultSettings(
+                bucket=config.s3.results_bucket,
+                prefix=config.s3.results_prefix,
+                presigned_url_expiry=config.s3.presigned_url_expiry,
+                region=config.bedrock.region,
+            )
+            self._settings = settings
+        return settings
+    
     @property
     def region(self):
         """Get AWS region."""
-        return get_chatbot_config().bedrock.region
+        return self.settings.region
     
     @property
     def client(self):
         """Lazy initialization of S3 client."""
         if self._client is None:
-            self._client = boto3.client("s3", region_name=self.region)
+            self._client = get_s3_client(self.region)
         return self._client
     
+    def _invalidate_settings(self) -> None:
+        """Drop cached settings and client so the next call picks up reloaded config."""
+        self._settings = None
+        self._client = None
+    
+    def _upload_result_body(self, s3_key: str, body: bytes, content_type: str) -> None:
+        """
+        Upload a serialized result file with the managed transfer API.
+        
+        Bodies of at least _GZIP_MIN_BYTES are gzip-compressed and stored
+        with Content-Encoding: gzip.
+        
+        Raises:
+            ClientError / S3UploadFailedError: If the upload fails
+        """
+        extra_args = {"ContentType": content_type}
+        size = len(body)
+        if size >= _GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=_GZIP_LEVEL, mtime=0)
+            extra_args["ContentEncoding"] = "gzip"
+        
+        self.client.upload_fileobj(
+            Fileobj=io.BytesIO(body),
+            Bucket=self.settings.bucket,
+            Key=s3_key,
+            ExtraArgs=extra_args,
+            Config=_RESULT_TRANSFER_CONFIG,
+        )
+        logger.info(
+            f"Uploaded result to s3://{self.settings.bucket}/{s3_key} "
+            f"({size} bytes, {len(body)} stored)"
+        )
+    
     def upload_result_csv(
         self,
         result: ResultPreview,
@@ -53,29 +159,19 @@ class S3ClientService:
             S3 key where the file was uploaded
         """
         # Generate file path
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        timestamp = _utc_file_timestamp()
         file_name = f"{session_id}_{message_id}_{timestamp}.csv"
-        s3_key = f"{self.config.results_prefix}{file_name}"
+        s3_key = f"{self.settings.prefix}{file_name}"
         
         # Create CSV content
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(result.columns)
-        writer.writerows(result.rows)
-        csv_content = output.getvalue()
+        csv_content = result_to_csv(result)
         
         # Upload to S3
         try:
-            self.client.put_object(
-                Bucket=self.config.results_bucket,
-                Key=s3_key,
-                Body=csv_content.encode("utf-8"),
-                ContentType="text/csv"
-            )
-            logger.info(f"Uploaded result to s3://{self.config.results_bucket}/{s3_key}")
+            self._upload_result_body(s3_key, csv_content, "text/csv")
             return s3_key
             
-        except ClientError as e:
+        except (ClientError, S3UploadFailedError) as e:
             logger.error(f"Failed to upload result: {e}")
             raise
     
@@ -91,9 +187,9 @@ class S3ClientService:
         Returns:
             S3 key where the file was uploaded
         """
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        timestamp = _utc_file_timestamp()
         file_name = f"{session_id}_{message_id}_{timestamp}.json"
-        s3_key = f"{self.config.results_prefix}{file_name}"
+        s3_key = f"{self.settings.prefix}{file_name}"
         
         # Create JSON content
         json_content = {
@@ -105,16 +201,12 @@ class S3ClientService:
         }
         
         try:
-            self.client.put_object(
-                Bucket=self.config.results_bucket,
-                Key=s3_key,
-                Body=json.dumps(json_content, default=str).encode("utf-8"),
-                ContentType="application/json"
+            self._upload_result_body(
+                s3_key, orjson.dumps(json_content, default=str), "application/json"
             )
-            logger.info(f"Uploaded result to s3://{self.config.results_bucket}/{s3_key}")
             return s3_key
             
-        except ClientError as e:
+        except (ClientError, S3UploadFailedError) as e:
             logger.error(f"Failed to upload result: {e}")
             raise
     
@@ -126,20 +218,39 @@ class S3ClientService:
         """
         Generate a presigned URL for downloading a result file.
         
+        URLs are cached per (bucket, key, expiry) and reused while at least
+        half of their lifetime remains, so repeated lookups skip signing.
+        
         Returns:
             Presigned URL string
         """
-        expiry = expiry_seconds or self.config.presigned_url_expiry
+        settings = self.settings
+        expiry = expiry_seconds or settings.presigned_url_expiry
+        bucket = settings.bucket
+        cache_key = (bucket, s3_key, expiry)
+        
+        now = time.monotonic()
+        with self._url_cache_lock:
+            cached = self._url_cache.get(cache_key)
+        if cached is not None and now < cached[1]:
+            return cached[0]
         
         try:
             url = self.client.generate_presigned_url(
                 "get_object",
                 Params={
-                    "Bucket": self.config.results_bucket,
+                    "Bucket": bucket,
                     "Key": s3_key
                 },
                 ExpiresIn=expiry
             )
+            
+            with self._url_cache_lock:
+                self._url_cache.pop(cache_key, None)
+                if len(self._url_cache) >= _PRESIGNED_URL_CACHE_SIZE:
+                    # Evict the oldest entry (dicts keep insertion order)
+                    del self._url_cache[next(iter(self._url_cache))]
+                self._url_cache[cache_key] = (url, now + expiry * (1 - _PRESIGNED_URL_MIN_REMAINING))
             return url
             
         except ClientError as e:
@@ -168,12 +279,18 @@ class S3ClientService:
     
     def delete_result(self, s3_key: str) -> bool:
         """Delete a result file from S3."""
+        bucket = self.settings.bucket
         try:
             self.client.delete_object(
-                Bucket=self.config.results_bucket,
+                Bucket=bucket,
                 Key=s3_key
             )
-            logger.info(f"Deleted s3://{self.config.results_bucket}/{s3_key}")
+            logger.info(f"Deleted s3://{bucket}/{s3_key}")
+            
+            # Drop cached download links for the deleted file
+            with self._url_cache_lock:
+                for cache_key in [k for k in self._url_cache if k[1] == s3_key]:
+                    del self._url_cache[cache_key]
             return True
             
         except ClientError as e:
@@ -182,21 +299,28 @@ class S3ClientService:
     
     def list_session_results(self, session_id: str) -> List[dict]:
         """List all result files for a session."""
-        prefix = f"{self.config.results_prefix}{session_id}_"
+        settings = self.settings
+        prefix = f"{settings.prefix}{session_id}_"
         
         try:
-            response = self.client.list_objects_v2(
-                Bucket=self.config.results_bucket,
-                Prefix=prefix
+            # A single list_objects_v2 call stops at 1000 keys; follow every page
+            paginator = self.client.get_paginator("list_objects_v2")
+            pages = paginator.paginate(
+                Bucket=settings.bucket,
+                Prefix=prefix,
+                PaginationConfig={"PageSize": 1000}
             )
             
             results = []
-            for obj in response.get("Contents", []):
-                results.append({
-                    "key": obj["Key"],
-                    "size": obj["Size"],
-                    "last_modified": obj["LastModified"].isoformat()
-                })
+            for page in pages:
+                results.extend(
+                    {
+                        "key": obj["Key"],
+                        "size": obj["Size"],
+                        "last_modified": obj["LastModified"].isoformat()
+                    }
+                    for obj in page.get("Contents", [])
+                )
             
             return results
             
@@ -1,15 +1,15 @@
 """S3 Configuration Loader - Loads chatbot and vector store configs from S3 or local files."""
 
 import os
-import json
 import logging
-from typing import Optional
+from typing import Callable, List, Optional
 from pathlib import Path
 
-import boto3
+import orjson
 from botocore.exceptions import ClientError
 
 from app.models.config_models import ChatbotConfig, VectorStoreConfig
+from app.utils.aws_session import get_s3_client
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +21,7 @@ class LocalVectorStoreConfig:
         self.index_path = data.get("index_path")
         self.documents_path = data.get("documents_path")
         self.embedding_model = data.get("embedding_model", "all-MiniLM-L6-v2")
+        self.onnx_model_path = data.get("onnx_model_path")  # Optional ONNX export of embedding_model
         self.embedding_dimension = data.get("embedding_dimension", 384)
         self.top_k = data.get("top_k", 10)
         self.similarity_threshold = data.get("similarity_threshold", 0.3)
@@ -51,18 +52,19 @@ class S3ConfigLoader:
             logger.warning("CONFIG_BUCKET not set and USE_LOCAL_CONFIG not true. Will use defaults.")
         
         self._s3_client = None
+        self._reload_listeners: List[Callable[[], None]] = []
     
     @property
     def s3_client(self):
         """Lazy initialization of S3 client."""
         if self._s3_client is None:
-            self._s3_client = boto3.client("s3", region_name=self.region)
+            self._s3_client = get_s3_client(self.region)
         return self._s3_client
     
     def _load_json_from_file(self, path: str) -> dict:
         """Load a JSON file from local filesystem."""
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
     
     def _load_json_from_s3(self, key: str) -> dict:
         """Load a JSON file from S3."""
@@ -71,13 +73,12 @@ class S3ConfigLoader:
         
         try:
             response = self.s3_client.get_object(Bucket=self.config_bucket, Key=key)
-            content = response["Body"].read().decode("utf-8")
-            return json.loads(content)
+            return orjson.loads(response["Body"].read())
         except ClientError as e:
             error_code = e.response.get("Error", {}).get("Code", "Unknown")
             logger.error(f"Failed to load config from s3://{self.config_bucket}/{key}: {error_code}")
             raise
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Invalid JSON in s3://{self.config_bucket}/{key}: {e}")
             raise
     
@@ -178,8 +179,19 @@ class S3ConfigLoader:
         logger.info("Reloading all configurations...")
         self.load_chatbot_config(force_reload=True)
         self.load_vector_store_config(force_reload=True)
+        for listener in self._reload_listeners:
+            listener()
         logger.info("All configurations reloaded")
     
+    def add_reload_listener(self, listener: Callable[[], None]) -> None:
+        """
+        Register a callback run after reload_configs.
+        
+        Services that cache values derived from the configs use this to
+        drop them once new configs are loaded.
+        """
+        self._reload_listeners.append(listener)
+    
     @classmethod
     def get_instance(cls) -> "S3ConfigLoader":
         """Get singleton instance of the config loader."""
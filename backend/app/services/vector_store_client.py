@@ -1,17 +1,139 @@
 """Vector Store Client - Connect to existing vector store for retrieval."""
 
 import os
-import json
+import importlib.util
 import logging
-from typing import Optional, List
+import queue
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from typing import Optional, List, Dict, Tuple
 from abc import ABC, abstractmethod
 from pathlib import Path
 
+import numpy as np
+import orjson
+
+from app.services.bedrock_llm import get_bedrock_service
 from app.services.s3_config_loader import get_vector_store_config
 from app.models.schema import RetrievedChunk
 
 logger = logging.getLogger(__name__)
 
+# Optional backends, imported once here rather than on every call; each
+# client raises ImportError on first use if its dependencies are missing.
+# sentence_transformers stays a lazy import since it loads torch.
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    import psycopg
+    from pgvector.psycopg import register_vector
+except ImportError:
+    psycopg = None
+    register_vector = None
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+
+class _QueryCache:
+    """
+    Semantic cache of search results, keyed by query embedding.
+    
+    A query whose whitespace-normalized text was seen before is answered
+    without embedding it; otherwise a query whose unit-length embedding has
+    cosine similarity >= threshold with a cached query (searched with the
+    same top_k) reuses that query's results. Entries expire after ttl
+    seconds and the least recently used entry is evicted when full.
+    """
+    
+    def __init__(self, threshold: float = 0.95, ttl: float = 300.0, max_size: int = 512):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        
+        # One row per slot; allocated on the first put, once the dimension is known
+        self._vectors: Optional[np.ndarray] = None
+        self._top_ks = np.zeros(max_size, dtype=np.int64)
+        self._expires = np.zeros(max_size, dtype=np.float64)  # 0 = free slot
+        
+        # slot -> (text key, results), in least to most recently used order
+        self._entries: "OrderedDict[int, Tuple[Tuple[str, int], List[RetrievedChunk]]]" = OrderedDict()
+        self._by_text: Dict[Tuple[str, int], int] = {}
+        self._lock = Lock()
+    
+    @staticmethod
+    def _text_key(query: str, top_k: int) -> Tuple[str, int]:
+        """Exact-match key: query text with whitespace normalized, and top_k."""
+        return " ".join(query.split()), top_k
+    
+    def _hit(self, slot: int, now: float) -> Optional[List[RetrievedChunk]]:
+        """Results for a slot if still fresh, marking it recently used."""
+        if self._expires[slot] <= now:
+            return None
+        self._entries.move_to_end(slot)
+        return list(self._entries[slot][1])
+    
+    def get_text(self, query: str, top_k: int) -> Optional[List[RetrievedChunk]]:
+        """Cached results for the same query text, before embedding it."""
+        with self._lock:
+            slot = self._by_text.get(self._text_key(query, top_k))
+            if slot is None:
+                return None
+            return self._hit(slot, time.monotonic())
+    
+    def get(self, embedding: np.ndarray, top_k: int) -> Optional[List[RetrievedChunk]]:
+        """Cached results for the most similar fresh query, if similar enough."""
+        with self._lock:
+            if self._vectors is None or not self._entries:
+                return None
+            now = time.monotonic()
+            scores = self._vectors @ embedding
+            scores[(self._top_ks != top_k) | (self._expires <= now)] = -1.0
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                return None
+            return self._hit(slot, now)
+    
+    def put(
+        self,
+        query: str,
+        embedding: np.ndarray,
+        top_k: int,
+        results: List[RetrievedChunk]
+    ) -> None:
+        """Cache the results of a search."""
+        text_key = self._text_key(query, top_k)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != embedding.shape[0]:
+                self._vectors = np.zeros((self.max_size, embedding.shape[0]), dtype=np.float32)
+                self._expires[:] = 0.0
+                self._entries.clear()
+                self._by_text.clear()
+            
+            slot = self._by_text.get(text_key)
+            if slot is None:
+                if len(self._entries) < self.max_size:
+                    slot = len(self._entries)
+                else:
+                    # Reuse the least recently used slot
+                    slot, (old_key, _) = self._entries.popitem(last=False)
+                    del self._by_text[old_key]
+                self._by_text[text_key] = slot
+            
+            self._vectors[slot] = embedding
+            self._top_ks[slot] = top_k
+            self._expires[slot] = time.monotonic() + self.ttl
+            self._entries[slot] = (text_key, list(results))
+            self._entries.move_to_end(slot)
+
 
 class VectorStoreClient(ABC):
     """Abstract base class for vector store clients."""
@@ -34,11 +156,25 @@ class VectorStoreClient(ABC):
 class FAISSClient(VectorStoreClient):
     """FAISS-based vector store client for local development."""
     
+    MAX_SEARCH_BATCH = 32  # Queries embedded and searched together
+    
     def __init__(self):
         self._index = None
         self._documents = None
         self._model = None
         self._config = None
+        self._query_cache = _QueryCache()
+        
+        # Set once index, documents and model are all loaded
+        self._loaded = Event()
+        self._load_lock = Lock()
+        # Why loading failed; a failed load is not retried on every query
+        self._load_error: Optional[Exception] = None
+        
+        # (query, top_k, future) waiting for the batching search thread
+        self._search_queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._search_worker: Optional[Thread] = None
+        self._search_worker_lock = Lock()
     
     @property
     def config(self):
@@ -47,125 +183,393 @@ class FAISSClient(VectorStoreClient):
             self._config = get_vector_store_config()
         return self._config
     
+    def _index_paths(self) -> Tuple[str, str]:
+        """Resolve the index and documents paths, defaulting to local_setup/faiss_index."""
+        local_index_dir = Path(__file__).parent.parent.parent / "local_setup" / "faiss_index"
+        index_path = getattr(self.config, 'index_path', None) or str(local_index_dir / "index.faiss")
+        docs_path = getattr(self.config, 'documents_path', None) or str(local_index_dir / "documents.json")
+        return index_path, docs_path
+    
     def _load_index(self):
-        """Load FAISS index and documents."""
-        if self._index is not None:
-            return
+        """
+        Load FAISS index and documents.
         
-        try:
-            import faiss
-            from sentence_transformers import SentenceTransformer
-            
-            # Load index
-            index_path = self.config.index_path if hasattr(self.config, 'index_path') else None
-            if not index_path:
-                # Try default local path
-                local_setup_dir = Path(__file__).parent.parent.parent / "local_setup"
-                index_path = str(local_setup_dir / "faiss_index" / "index.faiss")
-            
-            logger.info(f"Loading FAISS index from {index_path}")
-            self._index = faiss.read_index(index_path)
-            
-            # Load documents
-            docs_path = self.config.documents_path if hasattr(self.config, 'documents_path') else None
-            if not docs_path:
-                local_setup_dir = Path(__file__).parent.parent.parent / "local_setup"
-                docs_path = str(local_setup_dir / "faiss_index" / "documents.json")
-            
-            with open(docs_path, "r", encoding="utf-8") as f:
-                self._documents = json.load(f)
-            
-            # Load embedding model
-            model_name = getattr(self.config, 'embedding_model', 'all-MiniLM-L6-v2')
-            logger.info(f"Loading embedding model: {model_name}")
-            self._model = SentenceTransformer(model_name)
-            
-            logger.info(f"FAISS index loaded with {self._index.ntotal} vectors")
+        Raises:
+            RuntimeError: If loading failed, now or on an earlier attempt
+        """
+        if not self._loaded.is_set():
+            self._load_index_once()
+    
+    def _load_index_once(self) -> None:
+        """Load index, documents and model unless another thread already did."""
+        with self._load_lock:
+            # The prewarm thread may have finished loading while we waited
+            if self._loaded.is_set():
+                return
+            if self._load_error is not None:
+                raise RuntimeError(f"FAISS index failed to load: {self._load_error}")
             
-        except ImportError as e:
-            logger.error(f"FAISS dependencies not installed: {e}")
-            logger.error("Install with: pip install faiss-cpu sentence-transformers")
-            raise
-        except Exception as e:
-            logger.error(f"Failed to load FAISS index: {e}")
-            raise
+            try:
+                if faiss is None:
+                    raise ImportError("No module named 'faiss'")
+                
+                index_path, docs_path = self._index_paths()
+                
+                # Load index
+                logger.info(f"Loading FAISS index from {index_path}")
+                self._index = self._read_index(index_path)
+                self._tune_index()
+                
+                # Load documents
+                with open(docs_path, "rb") as f:
+                    raw_documents = orjson.loads(f.read())
+                
+                # Resolve metadata and source once instead of per search hit
+                self._documents = []
+                for doc in raw_documents:
+                    metadata = doc.get("metadata") or {}
+                    self._documents.append((doc["content"], metadata, metadata.get("source")))
+                
+                # Load embedding model, preferring an ONNX export when configured
+                model_name = getattr(self.config, 'embedding_model', 'all-MiniLM-L6-v2')
+                onnx_model_path = getattr(self.config, 'onnx_model_path', None)
+                if onnx_model_path:
+                    try:
+                        from app.services.onnx_embedder import OnnxMiniLM
+                        self._model = OnnxMiniLM(onnx_model_path)
+                    except (ImportError, FileNotFoundError) as e:
+                        logger.warning(f"ONNX embedding model unavailable, using PyTorch: {e}")
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    logger.info(f"Loading embedding model: {model_name}")
+                    self._model = SentenceTransformer(model_name)
+                
+                self._loaded.set()
+                logger.info(f"FAISS index loaded with {self._index.ntotal} vectors")
+                
+            except ImportError as e:
+                logger.error(f"FAISS dependencies not installed: {e}")
+                logger.error("Install with: pip install faiss-cpu sentence-transformers")
+                self._load_error = e
+                raise
+            except Exception as e:
+                logger.error(f"Failed to load FAISS index: {e}")
+                self._load_error = e
+                raise
+    
+    def prewarm(self) -> None:
+        """
+        Load the index and embedding model on a background thread.
+        
+        Model loading takes seconds; starting it when the client is created
+        means it is usually done before the first query arrives. A query
+        that arrives earlier waits for the load in progress.
+        """
+        def load():
+            try:
+                self._load_index()
+            except Exception:
+                pass  # Already logged; searches return no results
+        
+        Thread(target=load, name="faiss-prewarm", daemon=True).start()
+    
+    @staticmethod
+    def _read_index(index_path: str):
+        """
+        Memory-map a FAISS index read-only, falling back to a full read.
+        
+        Mapped pages are demand-paged from disk and live in the kernel page
+        cache, so startup does not copy the index into process memory and
+        several workers serving the same file share one copy. The file must
+        not be modified in place while mapped: writers should build a new
+        file and atomically rename it over the old one.
+        
+        Args:
+            index_path: Path to the serialized index
+        
+        Returns:
+            FAISS index
+        """
+        try:
+            return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            logger.info(f"FAISS index cannot be memory-mapped, reading into memory: {e}")
+            return faiss.read_index(index_path)
+    
+    def _tune_index(self) -> None:
+        """
+        Apply query-time speed/recall settings to approximate indexes.
+        
+        FAISS_NPROBE sets how many inverted lists an IVF index scans and
+        FAISS_EF_SEARCH the HNSW search breadth (of the index itself or of
+        an IVF index's coarse quantizer). Exact (flat) indexes are unaffected.
+        FAISS_OMP_THREADS sets how many OpenMP threads a batched search is
+        spread over (default: all cores).
+        """
+        nprobe = int(os.environ.get("FAISS_NPROBE", "16"))
+        ef_search = int(os.environ.get("FAISS_EF_SEARCH", "64"))
+        omp_threads = int(os.environ.get("FAISS_OMP_THREADS", os.cpu_count() or 1))
+        
+        faiss.omp_set_num_threads(omp_threads)
+        logger.info(f"FAISS OpenMP threads={omp_threads}")
+        
+        hnsw_index = self._index
+        try:
+            ivf = faiss.extract_index_ivf(self._index)
+        except RuntimeError:
+            ivf = None  # Not an IVF index
+        if ivf is not None:
+            ivf.nprobe = min(nprobe, ivf.nlist)
+            hnsw_index = faiss.downcast_index(ivf.quantizer)
+            logger.info(f"FAISS IVF index: nprobe={ivf.nprobe} of {ivf.nlist} lists")
+        
+        if hasattr(hnsw_index, "hnsw"):
+            hnsw_index.hnsw.efSearch = ef_search
+            logger.info(f"FAISS HNSW efSearch={ef_search}")
     
     def search_similar(
         self,
         query: str,
         top_k: Optional[int] = None
     ) -> List[RetrievedChunk]:
-        """Search for similar documents using FAISS."""
-        self._load_index()
+        """
+        Search for similar documents using FAISS.
+        
+        Queries from concurrent callers are embedded and searched together
+        by a worker thread; this call blocks until its own results are ready.
+        Returns no results if the index could not be loaded.
+        """
+        try:
+            self._load_index()
+        except Exception as e:
+            logger.error(f"FAISS search unavailable: {e}")
+            return []
         
         top_k = top_k or self.config.top_k
         
+        cached = self._query_cache.get_text(query, top_k)
+        if cached is not None:
+            return cached
+        
+        future: Future = Future()
+        self._ensure_search_worker()
+        self._search_queue.put((query, top_k, future))
+        
         try:
-            import faiss
-            import numpy as np
-            
-            # Generate query embedding
-            query_embedding = self._model.encode([query], convert_to_numpy=True)
-            query_embedding = query_embedding.astype("float32")
-            faiss.normalize_L2(query_embedding)
-            
-            # Search
-            scores, indices = self._index.search(query_embedding, top_k)
+            return future.result()
+        except Exception as e:
+            logger.error(f"FAISS search failed: {e}")
+            return []
+    
+    def _ensure_search_worker(self) -> None:
+        """Start the batching search thread if it is not running."""
+        if self._search_worker is not None:
+            return
+        with self._search_worker_lock:
+            if self._search_worker is None:
+                self._search_worker = Thread(
+                    target=self._search_loop, name="faiss-search-batcher", daemon=True
+                )
+                self._search_worker.start()
+    
+    def _search_loop(self) -> None:
+        """
+        Serve queued searches in batches.
+        
+        Waits for one query, then takes every query already queued (up to
+        MAX_SEARCH_BATCH). There is no fixed collection window: a lone query
+        is served at once, and queries arriving while a batch is being
+        embedded form the next batch.
+        """
+        while True:
+            batch = [self._search_queue.get()]
+            while len(batch) < self.MAX_SEARCH_BATCH:
+                try:
+                    batch.append(self._search_queue.get_nowait())
+                except queue.Empty:
+                    break
             
+            try:
+                self._search_batch(batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    def _search_batch(self, batch: List[Tuple[str, int, Future]]) -> None:
+        """Embed a batch of queries in one model call and search them in one index call."""
+        # Generate unit-length query embeddings (no copy when already float32)
+        query_embeddings = self._model.encode(
+            [query for query, _, _ in batch], convert_to_numpy=True, normalize_embeddings=True
+        )
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        
+        pending = []
+        for i, (_, top_k, future) in enumerate(batch):
+            cached = self._query_cache.get(query_embeddings[i], top_k)
+            if cached is not None:
+                future.set_result(cached)
+            else:
+                pending.append(i)
+        if not pending:
+            return
+        
+        # Search once with the largest top_k; each query keeps its own prefix
+        max_top_k = max(batch[i][1] for i in pending)
+        # Fancy indexing yields a fresh C-contiguous (nq, d) array, which FAISS
+        # splits across its OpenMP threads
+        scores, indices = self._index.search(query_embeddings[pending], max_top_k)
+        
+        # Drop empty slots and below-threshold hits for the whole batch at once
+        threshold = getattr(self.config, 'similarity_threshold', 0.3)
+        keep = (indices >= 0) & (scores >= threshold)
+        for row, i in enumerate(pending):
+            query, top_k, future = batch[i]
             results = []
-            threshold = getattr(self.config, 'similarity_threshold', 0.3)
-            
-            for score, idx in zip(scores[0], indices[0]):
-                if idx < 0 or score < threshold:
-                    continue
-                
-                doc = self._documents[idx]
+            row_keep = keep[row, :top_k]
+            # tolist() yields Python floats/ints instead of numpy scalars
+            row_scores = scores[row, :top_k][row_keep].tolist()
+            row_indices = indices[row, :top_k][row_keep].tolist()
+            for score, idx in zip(row_scores, row_indices):
+                content, metadata, source = self._documents[idx]
                 results.append(RetrievedChunk(
-                    content=doc["content"],
-                    metadata=doc.get("metadata", {}),
-                    score=float(score),
-                    source=doc.get("metadata", {}).get("source")
+                    content=content,
+                    metadata=metadata,
+                    score=score,
+                    source=source
                 ))
             
-            logger.info(f"Found {len(results)} relevant chunks for query")
-            return results
-            
-        except Exception as e:
-            logger.error(f"FAISS search failed: {e}")
-            return []
+            self._query_cache.put(query, query_embeddings[i], top_k, results)
+            future.set_result(results)
+        
+        logger.info(f"Searched {len(batch)} queries in one batch ({len(pending)} not cached)")
     
     def health_check(self) -> bool:
-        """Check if FAISS is accessible."""
-        try:
-            self._load_index()
-            return self._index is not None
-        except Exception as e:
-            logger.error(f"FAISS health check failed: {e}")
+        """
+        Check that FAISS, an embedding model and the index files are available.
+        
+        Only checks for the files and modules, so it stays cheap; the actual
+        load happens in prewarm() or on the first search. Once a load has
+        failed the client reports unhealthy.
+        """
+        if self._load_error is not None:
+            logger.error(f"FAISS health check failed: {self._load_error}")
+            return False
+        
+        if faiss is None:
+            logger.error("FAISS health check failed: faiss is not installed")
+            return False
+        
+        has_model = (
+            getattr(self.config, 'onnx_model_path', None)
+            or importlib.util.find_spec("sentence_transformers") is not None
+        )
+        if not has_model:
+            logger.error("FAISS health check failed: sentence-transformers is not installed")
             return False
+        
+        missing = [path for path in self._index_paths() if not Path(path).exists()]
+        if missing:
+            logger.error(f"FAISS health check failed: missing {', '.join(missing)}")
+            return False
+        return True
 
 
 class PgVectorClient(VectorStoreClient):
     """PostgreSQL pgvector client for semantic search."""
     
+    POOL_MIN_SIZE = 4
+    POOL_MAX_SIZE = 16
+    
+    # The query vector is sent once, typed by pgvector's adapter. Distance is
+    # computed once per row and ordered on directly, so an HNSW/IVFFlat index
+    # can serve the ORDER BY ... LIMIT. The threshold is applied to those top
+    # rows afterwards, which returns the same rows as filtering first since
+    # the filter and the ordering use the same distance; distance <= 1 -
+    # threshold is the same filter as similarity >= threshold.
+    SEARCH_SQL = """
+        SELECT content, metadata, 1 - distance AS similarity
+        FROM (
+            SELECT content, metadata, embedding <=> %(query)s AS distance
+            FROM {table}
+            ORDER BY distance
+            LIMIT %(top_k)s
+        ) AS nearest
+        WHERE distance <= %(max_distance)s
+        ORDER BY distance
+    """
+    
     def __init__(self):
-        self._connection = None
+        self._pool = None
+        self._connection = None  # Used when psycopg_pool is not installed
+        self._connection_lock = Lock()
         self._config = get_vector_store_config()
+        self._query_cache = _QueryCache()
     
     @property
     def config(self):
         """Get current vector store configuration."""
         return get_vector_store_config()
     
+    def _configure_connection(self, conn) -> None:
+        """
+        Prepare a new connection for vector search.
+        
+        Registers pgvector's adapters so vectors are sent in binary, and
+        sets the session's approximate-index search breadth once:
+        PGV_EF_SEARCH for HNSW indexes (pgvector default 40) and
+        PGV_IVF_PROBES for IVFFlat indexes (default 1). Higher values trade
+        latency for recall; exact scans ignore both.
+        """
+        register_vector(conn)
+        
+        ef_search = int(os.environ.get("PGV_EF_SEARCH", "80"))
+        probes = int(os.environ.get("PGV_IVF_PROBES", "10"))
+        # SET takes no bind parameters; set_config() does
+        conn.execute(
+            "SELECT set_config('hnsw.ef_search', %s, false), set_config('ivfflat.probes', %s, false)",
+            (str(ef_search), str(probes)),
+        )
+        # Pools only accept connections returned idle, not mid-transaction
+        conn.commit()
+    
+    @contextmanager
     def _get_connection(self):
-        """Get database connection."""
-        if self._connection is None or self._connection.closed:
-            try:
-                import psycopg
-                self._connection = psycopg.connect(self.config.connection_string)
-            except ImportError:
-                logger.error("psycopg not installed. Install with: pip install psycopg[binary]")
-                raise
-        return self._connection
+        """
+        Borrow a database connection.
+        
+        Connections come from a psycopg_pool pool when available, else one
+        shared connection is used. Either way, prepare_threshold=0 makes
+        psycopg prepare every statement on first use, so repeated searches
+        skip parsing and planning.
+        """
+        if psycopg is None:
+            logger.error(
+                "psycopg/pgvector not installed. Install with: pip install psycopg[binary,pool] pgvector"
+            )
+            raise ImportError("No module named 'psycopg' or 'pgvector'")
+        
+        if ConnectionPool is not None:
+            with self._connection_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(
+                        self.config.connection_string,
+                        min_size=self.POOL_MIN_SIZE,
+                        max_size=self.POOL_MAX_SIZE,
+                        kwargs={"prepare_threshold": 0},
+                        configure=self._configure_connection,
+                    )
+            with self._pool.connection() as conn:
+                yield conn
+            return
+        
+        with self._connection_lock:
+            if self._connection is None or self._connection.closed:
+                self._connection = psycopg.connect(
+                    self.config.connection_string, prepare_threshold=0
+                )
+                self._configure_connection(self._connection)
+        yield self._connection
     
     def search_similar(
         self,
@@ -175,8 +579,11 @@ class PgVectorClient(VectorStoreClient):
         """Search for similar documents using pgvector."""
         top_k = top_k or self.config.top_k
         
+        cached = self._query_cache.get_text(query, top_k)
+        if cached is not None:
+            return cached
+        
         # Get embedding for query - need Bedrock for this
-        from app.services.bedrock_llm import get_bedrock_service
         bedrock_service = get_bedrock_service()
         query_embedding = bedrock_service.get_embeddings(query)
         
@@ -184,40 +591,42 @@ class PgVectorClient(VectorStoreClient):
             logger.warning("Failed to get query embedding")
             return []
         
+        # Converted once and scaled to unit length: the semantic cache compares
+        # by dot product, and pgvector's cosine distance ignores scale, so the
+        # same array serves as both cache key and query parameter
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query_vector))
+        if norm > 0:
+            query_vector /= norm
+        cached = self._query_cache.get(query_vector, top_k)
+        if cached is not None:
+            return cached
+        
         try:
-            conn = self._get_connection()
-            with conn.cursor() as cur:
-                sql = f"""
-                    SELECT 
-                        content,
-                        metadata,
-                        1 - (embedding <=> %s::vector) as similarity
-                    FROM {self.config.table}
-                    WHERE 1 - (embedding <=> %s::vector) >= %s
-                    ORDER BY embedding <=> %s::vector
-                    LIMIT %s
-                """
-                
-                embedding_str = f"[{','.join(map(str, query_embedding))}]"
-                cur.execute(sql, (
-                    embedding_str,
-                    embedding_str,
-                    self.config.similarity_threshold,
-                    embedding_str,
-                    top_k
-                ))
-                
-                results = []
-                for row in cur.fetchall():
-                    content, metadata, similarity = row
-                    results.append(RetrievedChunk(
-                        content=content,
-                        metadata=metadata or {},
-                        score=float(similarity),
-                        source=metadata.get("source") if metadata else None
-                    ))
-                
-                return results
+            with self._get_connection() as conn:
+                # Binary protocol sends the vector as 4-byte floats rather than text
+                with conn.cursor(binary=True) as cur:
+                    params = {
+                        "query": query_vector,
+                        "max_distance": 1 - self.config.similarity_threshold,
+                        "top_k": top_k,
+                    }
+                    cur.execute(self.SEARCH_SQL.format(table=self.config.table), params, prepare=True)
+                    
+                    # Rows are decoded as the cursor is iterated; LIMIT already
+                    # bounds the result, so no server-side cursor is needed
+                    results = []
+                    for content, metadata, similarity in cur:
+                        metadata = metadata or {}
+                        results.append(RetrievedChunk(
+                            content=content,
+                            metadata=metadata,
+                            score=float(similarity),
+                            source=metadata.get("source")
+                        ))
+            
+            self._query_cache.put(query, query_vector, top_k, results)
+            return results
                 
         except Exception as e:
             logger.error(f"Vector search failed: {e}")
@@ -226,19 +635,45 @@ class PgVectorClient(VectorStoreClient):
     def health_check(self) -> bool:
         """Check if pgvector is accessible."""
         try:
-            conn = self._get_connection()
-            with conn.cursor() as cur:
-                cur.execute("SELECT 1")
+            with self._get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
             return True
         except Exception as e:
             logger.error(f"Vector store health check failed: {e}")
             return False
     
     def close(self):
-        """Close the database connection."""
-        if self._connection and not self._connection.closed:
-            self._connection.close()
-            self._connection = None
+        """Close the connection pool or database connection."""
+        with self._connection_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+            if self._connection and not self._connection.closed:
+                self._connection.close()
+                self._connection = None
+
+
+# Built once: the mock returns the same chunk on every call
+_MOCK_CHUNK = RetrievedChunk(
+    content="""
+# Schema Overview
+
+E-commerce database with customer orders and product catalog.
+
+## Tables
+- customers: customerid, firstname, lastname, email, phonenumber
+- orders: orderid, customerid, orderdate, orderamount, orderstatus
+- order_items: orderitemid, orderid, productid, quantity, unitprice
+- products: productid, productname, category, price, stockquantity
+
+## Relationships
+customers (1) ─ (N) orders (1) ─ (N) order_items (N) ─ (1) products
+""",
+    metadata={"type": "schema", "table": "all"},
+    score=0.9,
+    source="schema_overview.md"
+)
 
 
 class MockVectorClient(VectorStoreClient):
@@ -252,27 +687,7 @@ class MockVectorClient(VectorStoreClient):
         """Return mock results for testing."""
         logger.warning("Using mock vector client - no real vector store configured")
         
-        return [
-            RetrievedChunk(
-                content="""
-                # Schema Overview
-                
-                E-commerce database with customer orders and product catalog.
-                
-                ## Tables
-                - customers: customerid, firstname, lastname, email, phonenumber
-                - orders: orderid, customerid, orderdate, orderamount, orderstatus
-                - order_items: orderitemid, orderid, productid, quantity, unitprice
-                - products: productid, productname, category, price, stockquantity
-                
-                ## Relationships
-                customers (1) ─ (N) orders (1) ─ (N) order_items (N) ─ (1) products
-                """,
-                metadata={"type": "schema", "table": "all"},
-                score=0.9,
-                source="schema_overview.md"
-            )
-        ]
+        return [_MOCK_CHUNK]
     
     def health_check(self) -> bool:
         """Mock client is always healthy."""
@@ -289,6 +704,7 @@ def create_vector_client() -> VectorStoreClient:
             client = FAISSClient()
             if client.health_check():
                 logger.info("Using FAISS vector store")
+                client.prewarm()
                 return client
         except Exception as e:
             logger.warning(f"Failed to create FAISS client: {e}")
@@ -0,0 +1,47 @@
+"""AWS Session - One boto3 session and S3 client shared across services."""
+
+import logging
+from threading import Lock
+from typing import Any, Dict
+
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Credential and endpoint discovery happens once per session, not per client
+_SESSION = boto3.session.Session()
+
+# Large enough for multipart uploads fanning out chunks in parallel
+S3_CLIENT_CONFIG = Config(
+    max_pool_connections=50,
+    retries={"max_attempts": 3, "mode": "standard"},
+)
+
+_s3_clients: Dict[str, Any] = {}
+_s3_clients_lock = Lock()
+
+
+def get_s3_client(region: str):
+    """
+    Get the shared S3 client for a region, creating it on first use.
+
+    boto3 clients are thread-safe, so every service talking to S3 in the
+    same region reuses one client and its connection pool. Sessions are
+    not, so client creation is serialized.
+
+    Args:
+        region: AWS region name
+
+    Returns:
+        boto3 S3 client
+    """
+    client = _s3_clients.get(region)
+    if client is None:
+        with _s3_clients_lock:
+            client = _s3_clients.get(region)
+            if client is None:
+                client = _SESSION.client("s3", region_name=region, config=S3_CLIENT_CONFIG)
+                _s3_clients[region] = client
+                logger.debug(f"Created shared S3 client for {region}")
+    return client
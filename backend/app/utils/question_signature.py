@@ -0,0 +1,55 @@
+"""Question Signatures - 64-bit word bitsets for fast question similarity."""
+
+import zlib
+
+import numpy as np
+
+# Number of set bits in every byte value, for vectorized popcounts
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def question_signature(question: str) -> int:
+    """
+    Hash each lower-cased word of a question into a 64-bit bitset.
+
+    Uses crc32 rather than hash() so signatures stay stable across
+    processes and can be persisted with the feedback record.
+    """
+    bits = 0
+    for word in question.lower().split():
+        bits |= 1 << (zlib.crc32(word.encode("utf-8")) & 63)
+    return bits
+
+
+def estimated_similarity(bits1: int, bits2: int) -> float:
+    """Approximate Jaccard similarity from two question signatures."""
+    union = bin(bits1 | bits2).count("1")
+    if not union:
+        return 0.0
+    return bin(bits1 & bits2).count("1") / union
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Set-bit counts of a uint64 array."""
+    return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def estimated_similarities(signatures: np.ndarray, bits: int) -> np.ndarray:
+    """
+    Vectorized estimated_similarity of one signature against many.
+
+    Args:
+        signatures: uint64 array of question signatures
+        bits: Signature to compare against
+
+    Returns:
+        float64 array of estimated Jaccard similarities
+    """
+    query = np.uint64(bits)
+    union = _popcount(signatures | query)
+    intersection = _popcount(signatures & query)
+    return np.divide(
+        intersection, union,
+        out=np.zeros(len(signatures), dtype=np.float64),
+        where=union > 0,
+    )
@@ -0,0 +1,51 @@
+"""Regex Utilities - Linear-time pattern compilation for hot paths."""
+
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+try:
+    import re2  # google-re2: DFA-based, guaranteed linear-time matching
+except ImportError:
+    re2 = None
+
+
+def compile_pattern(pattern: str):
+    """
+    Compile a regex with RE2 when available, falling back to stdlib re.
+
+    Flags must be given inline (e.g. "(?i)", "(?s)") since RE2 does not
+    accept re module flags. Patterns RE2 rejects also fall back to re.
+    The returned object supports search(), match() and findall().
+    """
+    if re2 is not None:
+        try:
+            return re2.compile(pattern)
+        except re2.error as e:
+            logger.debug(f"RE2 rejected pattern {pattern!r}, using re: {e}")
+    return re.compile(pattern)
+
+
+def compile_untrusted_pattern(pattern: str, ignore_case: bool = False):
+    """
+    Compile a user-supplied regex without risking catastrophic backtracking.
+
+    With RE2 available the pattern must be RE2-compatible: features that
+    need backtracking (backreferences, lookaround) are rejected instead of
+    falling back to re. Without RE2 the pattern is compiled with re.
+
+    Raises:
+        ValueError: If the pattern is invalid or unsupported
+    """
+    if re2 is not None:
+        options = re2.Options()
+        options.case_sensitive = not ignore_case
+        try:
+            return re2.compile(pattern, options)
+        except re2.error as e:
+            raise ValueError(f"Unsupported pattern {pattern!r}: {e}") from e
+    try:
+        return re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+    except re.error as e:
+        raise ValueError(f"Invalid pattern {pattern!r}: {e}") from e
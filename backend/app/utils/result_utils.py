@@ -1,6 +1,12 @@
 """Result Utilities - Processing and analysis of query results."""
 
+import csv
+import hashlib
+import io
 import logging
+import pickle
+from collections import OrderedDict
+from threading import Lock
 from typing import List, Any, Dict, Optional
 from datetime import datetime, date
 import re
@@ -12,11 +18,106 @@ from app.models.visualization import (
 
 logger = logging.getLogger(__name__)
 
+# DataAnalysis of recently analyzed results, keyed by _result_fingerprint
+_ANALYSIS_CACHE_SIZE = 256
+_analysis_cache: "OrderedDict[bytes, DataAnalysis]" = OrderedDict()
+_analysis_cache_lock = Lock()
+
+
+def result_to_csv(result: ResultPreview) -> bytes:
+    """
+    Serialize a result as UTF-8 CSV, byte-identical to csv.writer's default dialect.
+    
+    Rows of plain strings are joined in bulk. The joined text is then checked
+    for anything csv.writer would have quoted (commas, quotes or line breaks
+    inside a value, single-value rows); if found, it falls back to csv.writer.
+    """
+    header = result.columns
+    rows = result.rows
+    
+    try:
+        if len(header) > 1 and all(len(row) > 1 for row in rows):
+            lines = [",".join(header)]
+            lines.extend([",".join(row) for row in rows])
+            text = "\r\n".join(lines) + "\r\n"
+            
+            # Every comma, CR and LF must be a separator or line terminator
+            expected_commas = len(header) - 1 + sum(map(len, rows)) - len(rows)
+            if (
+                '"' not in text
+                and text.count(",") == expected_commas
+                and text.count("\n") == len(lines)
+                and text.count("\r") == len(lines)
+            ):
+                return text.encode("utf-8")
+    except TypeError:
+        # Non-string values (usually on the first row). csv.writer formats
+        # numbers and None in C, as fast as joining str() of each value.
+        pass
+    
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return output.getvalue().encode("utf-8")
+
+
+def _distinct_text_count(values: List[Any]) -> int:
+    """
+    Number of distinct str() forms among values.
+    
+    All-str and all-int columns are counted directly, since str() is
+    one-to-one on them; other columns are converted first (e.g. 1 and 1.0
+    are equal but print differently).
+    """
+    value_types = set(map(type, values))
+    if len(value_types) == 1 and value_types <= {str, int}:
+        return len(set(values))
+    return len(set(str(v) for v in values))
+
+
+def _result_fingerprint(result: ResultPreview) -> Optional[bytes]:
+    """
+    Digest of a result's columns and rows, or None if they cannot be pickled.
+    
+    Pickling keeps value types apart (1, 1.0, "1" and NaN vs None all
+    differ), which the analysis depends on.
+    """
+    try:
+        payload = pickle.dumps((result.columns, result.rows), protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
 
 def analyze_result_data(result: ResultPreview) -> DataAnalysis:
     """
     Analyze query result data to determine appropriate visualizations.
+    
+    Analyses are cached by result content, so re-running a query that
+    returns the same data skips the per-value scan.
     """
+    fingerprint = _result_fingerprint(result)
+    if fingerprint is not None:
+        with _analysis_cache_lock:
+            cached = _analysis_cache.get(fingerprint)
+            if cached is not None:
+                _analysis_cache.move_to_end(fingerprint)
+        if cached is not None:
+            return cached.model_copy(deep=True)
+    
+    analysis = _analyze_result_data(result)
+    
+    if fingerprint is not None:
+        with _analysis_cache_lock:
+            _analysis_cache[fingerprint] = analysis.model_copy(deep=True)
+            if len(_analysis_cache) > _ANALYSIS_CACHE_SIZE:
+                _analysis_cache.popitem(last=False)
+    return analysis
+
+
+def _analyze_result_data(result: ResultPreview) -> DataAnalysis:
+    """Compute the DataAnalysis of a result."""
     columns = result.columns
     rows = result.rows
     
@@ -25,8 +126,11 @@ def analyze_result_data(result: ResultPreview) -> DataAnalysis:
     datetime_columns = []
     cardinality = {}
     
-    for i, col in enumerate(columns):
-        col_values = [row[i] for row in rows if row[i] is not None]
+    # Transpose once instead of indexing every row for every column
+    column_values = zip(*rows) if rows else [() for _ in columns]
+    
+    for col, values in zip(columns, column_values):
+        col_values = [v for v in values if v is not None]
         
         if not col_values:
             continue
@@ -41,8 +145,8 @@ def analyze_result_data(result: ResultPreview) -> DataAnalysis:
         else:
             categorical_columns.append(col)
         
-        # Calculate cardinality
-        cardinality[col] = len(set(str(v) for v in col_values))
+        # Calculate cardinality (of the values as text)
+        cardinality[col] = _distinct_text_count(col_values)
     
     # Detect patterns
     has_time_series = len(datetime_columns) > 0 and len(numeric_columns) > 0
@@ -70,28 +174,61 @@ def analyze_result_data(result: ResultPreview) -> DataAnalysis:
     )
 
 
+# Column name fragments that mark a datetime column
+_DATETIME_HINTS = ("date", "time", "created", "updated", "timestamp")
+
+# Values starting with an ISO (YYYY-MM-DD, optionally with a time) or US date.
+# A compiled match is as fast as hand-rolled slicing/isdecimal() checks here
+# (and faster on actual dates), so the regex stays.
+_DATETIME_RE = re.compile(r"\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4}")
+
+# Share of sampled values (nulls included) needed to pick a type
+_TYPE_THRESHOLD = 0.8
+
+
 def infer_column_type(values: List[Any], column_name: str) -> str:
     """
     Infer column type from sample values and column name.
     """
     # Check column name hints
-    datetime_hints = ["date", "time", "created", "updated", "timestamp"]
-    if any(hint in column_name.lower() for hint in datetime_hints):
+    name = column_name.lower()
+    if any(hint in name for hint in _DATETIME_HINTS):
         return "datetime"
     
     # Sample non-null values
     sample = values[:100]
+    total = len(sample)
+    if total == 0:
+        return "categorical"
+    
+    # Smallest count whose share of the sample exceeds the threshold
+    needed = int(total * _TYPE_THRESHOLD)
+    while needed / total <= _TYPE_THRESHOLD:
+        needed += 1
     
     numeric_count = 0
     datetime_count = 0
     
-    for val in sample:
+    for index, val in enumerate(sample):
+        # A value counts towards at most one type, so the answer is settled
+        # once either type reaches the threshold or neither still can
+        if numeric_count >= needed:
+            return "numeric"
+        if datetime_count >= needed:
+            return "datetime"
+        remaining = total - index
+        if numeric_count + remaining < needed and datetime_count + remaining < needed:
+            return "categorical"
+        
         if val is None:
             continue
         
-        val_str = str(val)
+        # Check numeric (ints and floats always parse; bools never do)
+        if type(val) is int or type(val) is float:
+            numeric_count += 1
+            continue
         
-        # Check numeric
+        val_str = str(val)
         try:
             float(val_str.replace(",", ""))
             numeric_count += 1
@@ -100,22 +237,12 @@ def infer_column_type(values: List[Any], column_name: str) -> str:
             pass
         
         # Check datetime patterns
-        datetime_patterns = [
-            r"\d{4}-\d{2}-\d{2}",
-            r"\d{2}/\d{2}/\d{4}",
-            r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}"
-        ]
-        if any(re.match(p, val_str) for p in datetime_patterns):
+        if _DATETIME_RE.match(val_str):
             datetime_count += 1
-            continue
-    
-    total = len(sample)
-    if total == 0:
-        return "categorical"
     
-    if datetime_count / total > 0.8:
+    if datetime_count >= needed:
         return "datetime"
-    if numeric_count / total > 0.8:
+    if numeric_count >= needed:
         return "numeric"
     
     return "categorical"
@@ -448,13 +575,25 @@ def create_table_chart(result: ResultPreview, analysis: DataAnalysis) -> ChartCo
     )
 
 
+MAX_ALTERNATIVE_CHARTS = 5
+
+# Below this many rows bubble/heatmap/3D charts have too little to show,
+# so they are not offered as alternatives
+MIN_ADVANCED_CHART_ROWS = 5
+
+
 def generate_alternative_charts(
     result: ResultPreview,
     analysis: DataAnalysis,
     quick_chart: Optional[ChartConfig],
     allow_advanced: bool
 ) -> List[ChartConfig]:
-    """Generate alternative chart options."""
+    """
+    Generate alternative chart options (at most MAX_ALTERNATIVE_CHARTS).
+    
+    Advanced chart types are skipped for results with fewer than
+    MIN_ADVANCED_CHART_ROWS rows.
+    """
     alternatives = []
     quick_type = quick_chart.type if quick_chart else None
     
@@ -466,7 +605,7 @@ def generate_alternative_charts(
         ("table", create_table_chart),
     ]
     
-    if allow_advanced:
+    if allow_advanced and analysis.row_count >= MIN_ADVANCED_CHART_ROWS:
         chart_generators.extend([
             ("bubble", create_bubble_chart),
             ("heatmap", create_heatmap_chart),
@@ -474,6 +613,8 @@ def generate_alternative_charts(
         ])
     
     for chart_type, generator in chart_generators:
+        if len(alternatives) == MAX_ALTERNATIVE_CHARTS:
+            break  # Later generators would only be discarded
         if chart_type != quick_type:
             try:
                 chart = generator(result, analysis)
@@ -483,4 +624,4 @@ def generate_alternative_charts(
                 logger.debug(f"Could not create {chart_type} chart: {e}")
                 continue
     
-    return alternatives[:5]  # Limit to 5 alternatives
+    return alternatives
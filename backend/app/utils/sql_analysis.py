@@ -0,0 +1,202 @@
+"""SQL Analysis - Shared, cached structural analysis of generated SQL.
+
+The policy engine (tables, patterns) and the GRPO reward functions
+(validity, format checks) both inspect the same SQL strings. analyze_sql
+runs all of those checks once per distinct SQL and caches the result.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+
+from app.utils.regex_utils import compile_pattern
+
+# All regexes below run against the upper-cased SQL, so none of them need
+# case-insensitive matching (which is slower for both re and RE2).
+
+# Table references following FROM / JOIN
+_FROM_TABLE_RE = compile_pattern(r'FROM\s+([A-Z_][A-Z0-9_]*)')
+_JOIN_TABLE_RE = compile_pattern(r'JOIN\s+([A-Z_][A-Z0-9_]*)')
+
+# Words that can follow FROM/JOIN but are not table names
+_NON_TABLE_WORDS = frozenset({'SELECT', 'WHERE', 'AND', 'OR', 'ON', 'AS'})
+
+# Common SQL patterns to track. Keyword patterns are plain literals
+# matched against whitespace-normalized, upper-cased SQL; patterns that
+# need a real regex are compiled (RE2 when available).
+SQL_PATTERNS = [
+    (("GROUP BY",), 'GROUP BY'),
+    (("JOIN ",), 'JOIN'),
+    (("LEFT JOIN",), 'LEFT JOIN'),
+    (("INNER JOIN",), 'INNER JOIN'),
+    (("CAST(", "CAST ("), 'CAST'),
+    (("COALESCE(", "COALESCE ("), 'COALESCE'),
+    (("CASE WHEN",), 'CASE WHEN'),
+    (("ORDER BY",), 'ORDER BY'),
+    (("HAVING ",), 'HAVING'),
+    (("DISTINCT ",), 'DISTINCT'),
+    (("COUNT(", "COUNT ("), 'COUNT'),
+    (("SUM(", "SUM ("), 'SUM'),
+    (("AVG(", "AVG ("), 'AVG'),
+    (("MAX(", "MAX ("), 'MAX'),
+    (("MIN(", "MIN ("), 'MIN'),
+    (compile_pattern(r'WHERE\s+.*\s+IN\s*\('), 'WHERE IN'),
+    (compile_pattern(r'WHERE\s+.*\s+LIKE\s+'), 'WHERE LIKE'),
+    (compile_pattern(r'WHERE\s+.*\s+BETWEEN\s+'), 'WHERE BETWEEN'),
+    (compile_pattern(r'LIMIT\s+\d+'), 'LIMIT'),
+    (("DATE_TRUNC",), 'DATE_TRUNC'),
+    (("TO_DATE",), 'TO_DATE'),
+    (("SUBSTRING",), 'SUBSTRING'),
+]
+
+# Best practice patterns (positive)
+GOOD_PATTERNS = [
+    (compile_pattern(r'CAST\s*\('), 'type_casting'),
+    (compile_pattern(r'COALESCE\s*\('), 'null_handling'),
+    (compile_pattern(r'AS\s+\w+'), 'column_aliasing'),
+    (compile_pattern(r'LIMIT\s+\d+'), 'row_limiting'),
+    (compile_pattern(r'ORDER\s+BY'), 'result_ordering'),
+]
+
+# Anti-patterns (negative)
+BAD_PATTERNS = [
+    (compile_pattern(r'SELECT\s+\*'), 'select_star'),  # SELECT * is often bad practice
+    (compile_pattern(r'\w+\.\w+\.\w+'), 'triple_prefix'),  # database.schema.table prefix
+    (compile_pattern(r'--[^\n]*\n?$'), 'sql_comment'),  # Comment on the last line (might indicate confusion)
+]
+
+# Lexical tokens of upper-cased SQL. Literals, quoted identifiers and
+# comments are single tokens so their contents are never read as keywords,
+# quotes or parentheses; a lone quote or "/*" marks an unterminated one.
+_TOKEN_RE = compile_pattern(
+    r"'(?:[^']|'')*'"
+    r'|"(?:[^"]|"")*"'
+    r'|--[^\n]*'
+    r'|/\*(?s:.*?)\*/'
+    r'|[\'"]|/\*'
+    r'|[()]'
+    r'|\w+'
+    r'|\S'
+)
+
+_AS_ALIAS_RE = compile_pattern(r'\bAS\s+\w+')
+
+# Upper-case keywords that indicate conventionally cased SQL
+_CASED_KEYWORDS = ('SELECT', 'FROM', 'WHERE', 'JOIN')
+
+
+@dataclass(frozen=True)
+class SqlAnalysis:
+    """Structural facts about one SQL string."""
+
+    __slots__ = (
+        'sql_lower', 'sql_upper', 'tables', 'patterns',
+        'has_select', 'has_from', 'balanced_parens', 'balanced_quotes', 'valid_structure',
+        'good_patterns', 'bad_patterns', 'has_aliases', 'has_newlines', 'has_proper_casing',
+    )
+
+    sql_lower: str
+    sql_upper: str
+    tables: Tuple[str, ...]
+    patterns: Tuple[str, ...]
+    has_select: bool
+    has_from: bool
+    balanced_parens: bool
+    balanced_quotes: bool
+    valid_structure: bool
+    good_patterns: Tuple[str, ...]
+    bad_patterns: Tuple[str, ...]
+    has_aliases: bool
+    has_newlines: bool
+    has_proper_casing: bool
+
+
+def _scan_structure(sql_upper: str) -> Tuple[bool, bool, bool, bool, bool]:
+    """
+    Tokenize upper-cased SQL once and derive its structural checks.
+
+    Returns:
+        Tuple of (has_select, has_from, balanced_parens, balanced_quotes,
+        valid_structure)
+    """
+    depth = 0
+    parens_ok = True
+    quotes_ok = True
+    select_at = -1
+    has_from = False
+    valid_structure = False
+    expect_table = False  # previous token was a FROM after SELECT
+
+    for index, match in enumerate(_TOKEN_RE.finditer(sql_upper)):
+        token = match.group()
+
+        if expect_table:
+            # FROM must be followed by a table name (plain or quoted)
+            if token[0] == '_' or token[0].isalnum() or (token[0] == '"' and len(token) > 1):
+                valid_structure = True
+            expect_table = False
+
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+            if depth < 0:
+                parens_ok = False
+        elif token in ("'", '"', '/*'):
+            quotes_ok = False
+        elif token == 'SELECT':
+            if select_at < 0:
+                select_at = index
+        elif token == 'FROM':
+            has_from = True
+            # Something must sit between SELECT and FROM
+            if 0 <= select_at < index - 1:
+                expect_table = True
+
+    return select_at >= 0, has_from, parens_ok and depth == 0, quotes_ok, valid_structure
+
+
+@lru_cache(maxsize=4096)
+def analyze_sql(sql: str) -> SqlAnalysis:
+    """Run every table, pattern, validity and format check on a SQL string once."""
+    sql_lower = sql.lower()
+    sql_upper = sql.upper()
+
+    # Tables from FROM and JOIN clauses, filtering keywords that might match
+    tables = set()
+    for pattern in (_FROM_TABLE_RE, _JOIN_TABLE_RE):
+        for match in pattern.findall(sql_upper):
+            if match not in _NON_TABLE_WORDS:
+                tables.add(match.lower())
+
+    # Normalize once so multi-space/newline variants collapse to the literals
+    normalized = " ".join(sql_upper.split())
+    patterns = []
+    for pattern, name in SQL_PATTERNS:
+        if isinstance(pattern, tuple):
+            found = any(literal in normalized for literal in pattern)
+        else:
+            found = pattern.search(sql_upper) is not None
+        if found:
+            patterns.append(name)
+
+    has_select, has_from, balanced_parens, balanced_quotes, valid_structure = (
+        _scan_structure(sql_upper)
+    )
+
+    return SqlAnalysis(
+        sql_lower=sql_lower,
+        sql_upper=sql_upper,
+        tables=tuple(tables),
+        patterns=tuple(patterns),
+        has_select=has_select,
+        has_from=has_from,
+        balanced_parens=balanced_parens,
+        balanced_quotes=balanced_quotes,
+        valid_structure=valid_structure,
+        good_patterns=tuple(name for pattern, name in GOOD_PATTERNS if pattern.search(sql_upper)),
+        bad_patterns=tuple(name for pattern, name in BAD_PATTERNS if pattern.search(sql_upper)),
+        has_aliases=bool(_AS_ALIAS_RE.search(sql_upper)),
+        has_newlines='\n' in sql,
+        has_proper_casing=any(kw in sql for kw in _CASED_KEYWORDS),
+    )
@@ -2,10 +2,18 @@
 
 import re
 import logging
+from functools import lru_cache
 from typing import Optional, List, Tuple
 
+from app.utils.regex_utils import compile_pattern
+
 logger = logging.getLogger(__name__)
 
+try:
+    import ahocorasick  # pyahocorasick: all keywords in one C-level pass
+except ImportError:
+    ahocorasick = None
+
 
 class SQLValidationError(Exception):
     """Exception for SQL validation failures."""
@@ -29,11 +37,107 @@ DANGEROUS_KEYWORDS = [
 
 REQUIRED_KEYWORDS = [r"\bSELECT\b"]
 
+# Patterns are compiled once here rather than looked up in re's cache on
+# every call. Search-only patterns go through compile_pattern (RE2 when
+# available); substitutions use re.
+#
+# Keyword and complexity patterns run against upper-cased SQL: one upper()
+# copy, shared by several scans, costs less than case-insensitive matching,
+# which makes re 2-3x slower (and the keyword automaton needs it anyway).
+_REQUIRED_RES = [compile_pattern(pattern) for pattern in REQUIRED_KEYWORDS]
+_DANGEROUS_WORDS = [pattern.replace(r"\b", "") for pattern in DANGEROUS_KEYWORDS]
+
+# All dangerous keywords in one alternation: a single pass over the query,
+# with the offending keyword captured
+_DANGEROUS_KEYWORD_RE = compile_pattern(r"\b(" + "|".join(_DANGEROUS_WORDS) + r")\b")
+
+# With pyahocorasick the same scan runs as one automaton walk in C
+if ahocorasick is not None:
+    _DANGEROUS_AUTOMATON = ahocorasick.Automaton()
+    for _word in _DANGEROUS_WORDS:
+        _DANGEROUS_AUTOMATON.add_word(_word, _word)
+    _DANGEROUS_AUTOMATON.make_automaton()
+else:
+    _DANGEROUS_AUTOMATON = None
+
+# Keywords that format_sql starts on a new line. Qualified joins come
+# before JOIN so the alternation keeps "LEFT JOIN" on one line.
+_FORMAT_KEYWORDS = [
+    "FROM", "WHERE", "AND", "OR", "ORDER BY", "GROUP BY",
+    "HAVING", "LIMIT", "LEFT JOIN", "RIGHT JOIN",
+    "INNER JOIN", "OUTER JOIN", "JOIN",
+]
+# The trailing whitespace is a lookahead so it can also precede the next keyword
+_FORMAT_RE = re.compile(rf"\s+({'|'.join(_FORMAT_KEYWORDS)})(?=\s)", re.IGNORECASE)
+
+# Table name after FROM or JOIN, in one pass (re builds findall() results
+# faster than the RE2 wrapper does)
+_TABLE_REF_RE = re.compile(r"\b(?:FROM|JOIN)\s+([a-zA-Z_][a-zA-Z0-9_\.]*)", re.IGNORECASE)
+
+_LIMIT_RE = re.compile(r"\bLIMIT\s+\d+", re.IGNORECASE)
+
+# Any one match puts a query in the category; each is a single alternation
+# so the query is scanned once per category
+_COMPLEX_QUERY_RE = compile_pattern("|".join([
+    r"\bWITH\b.*\bAS\b",
+    r"\bWINDOW\b",
+    r"\bPARTITION BY\b",
+    r"SELECT.*SELECT",  # Subqueries
+    r"\bUNION\b",
+    r"\bINTERSECT\b",
+]))
+_MODERATE_QUERY_RE = compile_pattern("|".join([
+    r"\bJOIN\b",
+    r"\bGROUP BY\b",
+    r"\bHAVING\b",
+    r"\bCASE\b.*\bWHEN\b",
+    r"\bDISTINCT\b",
+]))
+
+# SQL inside a ``` or ```sql fenced block of an LLM response
+SQL_CODE_BLOCK_RE = re.compile(r"```(?:sql)?\s*([\s\S]*?)```")
+
+
+def _is_word_char(char: str) -> bool:
+    """Whether a character is a letter, digit or underscore."""
+    return char.isalnum() or char == "_"
+
+
+def find_dangerous_keyword(sql_upper: str) -> Optional[str]:
+    """
+    Find the first dangerous keyword appearing as a whole word.
+    
+    Args:
+        sql_upper: Upper-cased SQL
+    
+    Returns:
+        The keyword, or None if the query has none
+    """
+    if _DANGEROUS_AUTOMATON is None:
+        match = _DANGEROUS_KEYWORD_RE.search(sql_upper)
+        return match.group(1) if match else None
+    
+    # The automaton matches substrings; keep only hits bounded like \b...\b
+    length = len(sql_upper)
+    for end, keyword in _DANGEROUS_AUTOMATON.iter(sql_upper):
+        start = end - len(keyword) + 1
+        if start > 0 and _is_word_char(sql_upper[start - 1]):
+            continue
+        if end + 1 < length and _is_word_char(sql_upper[end + 1]):
+            continue
+        return keyword
+    return None
+
 
+@lru_cache(maxsize=1024)
 def validate_sql(sql: str, allow_dangerous: bool = False) -> Tuple[bool, Optional[str]]:
     """
     Validate SQL for safety and correctness.
     
+    Each check is its own pass, but every pass runs in C (str.count, a
+    compiled pattern or the keyword automaton); fusing them into one
+    per-character Python loop is slower, not faster.
+    
     Returns:
         Tuple of (is_valid, error_message)
     """
@@ -43,29 +147,29 @@ def validate_sql(sql: str, allow_dangerous: bool = False) -> Tuple[bool, Optiona
     sql_upper = sql.upper()
     
     # Check for required SELECT
-    has_select = any(re.search(kw, sql_upper) for kw in REQUIRED_KEYWORDS)
+    has_select = any(pattern.search(sql_upper) for pattern in _REQUIRED_RES)
     if not has_select:
         return False, "Query must contain SELECT statement"
     
     # Check for dangerous keywords
     if not allow_dangerous:
-        for pattern in DANGEROUS_KEYWORDS:
-            if re.search(pattern, sql_upper):
-                keyword = pattern.replace(r"\b", "").replace("\\", "")
-                return False, f"Dangerous keyword detected: {keyword}"
+        keyword = find_dangerous_keyword(sql_upper)
+        if keyword:
+            return False, f"Dangerous keyword detected: {keyword}"
     
     # Check for balanced parentheses
     if sql.count("(") != sql.count(")"):
         return False, "Unbalanced parentheses in query"
     
-    # Check for balanced quotes
-    single_quotes = len(re.findall(r"(?<!')'(?!')", sql))
-    if single_quotes % 2 != 0:
+    # Check for balanced quotes. An escaped '' adds two quotes, so literals
+    # are balanced exactly when the total count is even
+    if sql.count("'") % 2 != 0:
         return False, "Unbalanced single quotes in query"
     
     return True, None
 
 
+@lru_cache(maxsize=1024)
 def sanitize_sql(sql: str) -> str:
     """
     Clean up and format SQL query.
@@ -73,8 +177,11 @@ def sanitize_sql(sql: str) -> str:
     # Remove leading/trailing whitespace
     sql = sql.strip()
     
-    # Remove multiple consecutive spaces
-    sql = re.sub(r" +", " ", sql)
+    # Remove multiple consecutive spaces. Each replace() halves the longest
+    # run, and SQL without double spaces costs a single substring search.
+    # Only spaces are collapsed: newlines end "--" comments.
+    while "  " in sql:
+        sql = sql.replace("  ", " ")
     
     # Remove trailing semicolons (Athena doesn't need them)
     sql = sql.rstrip(";")
@@ -89,23 +196,8 @@ def format_sql(sql: str) -> str:
     """
     Basic SQL formatting for readability.
     """
-    keywords = [
-        "SELECT", "FROM", "WHERE", "AND", "OR", "ORDER BY",
-        "GROUP BY", "HAVING", "LIMIT", "OFFSET", "JOIN",
-        "LEFT JOIN", "RIGHT JOIN", "INNER JOIN", "OUTER JOIN",
-        "ON", "AS", "UNION", "INTERSECT", "EXCEPT", "WITH"
-    ]
-    
-    formatted = sql
-    
-    # Add newlines before major keywords
-    for kw in ["FROM", "WHERE", "AND", "OR", "ORDER BY", "GROUP BY", 
-               "HAVING", "LIMIT", "JOIN", "LEFT JOIN", "RIGHT JOIN",
-               "INNER JOIN", "OUTER JOIN"]:
-        pattern = rf"(\s+)({kw}\s)"
-        formatted = re.sub(pattern, rf"\n{kw} ", formatted, flags=re.IGNORECASE)
-    
-    return formatted
+    # Add newlines before major keywords, all in one pass
+    return _FORMAT_RE.sub(lambda match: "\n" + match.group(1).upper(), sql)
 
 
 def extract_table_references(sql: str) -> List[str]:
@@ -115,37 +207,27 @@ def extract_table_references(sql: str) -> List[str]:
     Returns:
         List of table names
     """
-    tables = set()
-    
-    # Match FROM table pattern
-    from_pattern = r"\bFROM\s+([a-zA-Z_][a-zA-Z0-9_\.]*)"
-    for match in re.finditer(from_pattern, sql, re.IGNORECASE):
-        tables.add(match.group(1))
-    
-    # Match JOIN table pattern
-    join_pattern = r"\bJOIN\s+([a-zA-Z_][a-zA-Z0-9_\.]*)"
-    for match in re.finditer(join_pattern, sql, re.IGNORECASE):
-        tables.add(match.group(1))
-    
-    return list(tables)
+    # A fresh list per call; the cached tuple is shared
+    return list(_table_references(sql))
+
+
+@lru_cache(maxsize=1024)
+def _table_references(sql: str) -> Tuple[str, ...]:
+    """Distinct table names after FROM and JOIN."""
+    return tuple(set(_TABLE_REF_RE.findall(sql)))
 
 
 def add_limit_clause(sql: str, limit: int) -> str:
     """
     Add or update LIMIT clause in SQL query.
     """
-    # Check if limit already exists
-    if re.search(r"\bLIMIT\s+\d+", sql, re.IGNORECASE):
-        # Replace existing limit
-        return re.sub(
-            r"\bLIMIT\s+\d+",
-            f"LIMIT {limit}",
-            sql,
-            flags=re.IGNORECASE
-        )
-    else:
-        # Add limit
-        return f"{sql.rstrip(';')} LIMIT {limit}"
+    # Replace any existing limit in the same pass that looks for one
+    replaced, count = _LIMIT_RE.subn(f"LIMIT {limit}", sql)
+    if count:
+        return replaced
+    
+    # Add limit
+    return f"{sql.rstrip(';')} LIMIT {limit}"
 
 
 def wrap_with_cte(sql: str, cte_name: str = "source_data") -> str:
@@ -158,6 +240,7 @@ def wrap_with_cte(sql: str, cte_name: str = "source_data") -> str:
 SELECT * FROM {cte_name}"""
 
 
+@lru_cache(maxsize=1024)
 def estimate_query_complexity(sql: str) -> str:
     """
     Estimate query complexity based on syntax.
@@ -167,30 +250,10 @@ def estimate_query_complexity(sql: str) -> str:
     """
     sql_upper = sql.upper()
     
-    complexity_indicators = {
-        "complex": [
-            r"\bWITH\b.*\bAS\b",
-            r"\bWINDOW\b",
-            r"\bPARTITION BY\b",
-            r"SELECT.*SELECT",  # Subqueries
-            r"\bUNION\b",
-            r"\bINTERSECT\b",
-        ],
-        "moderate": [
-            r"\bJOIN\b",
-            r"\bGROUP BY\b",
-            r"\bHAVING\b",
-            r"\bCASE\b.*\bWHEN\b",
-            r"\bDISTINCT\b"
-        ]
-    }
-    
-    for pattern in complexity_indicators["complex"]:
-        if re.search(pattern, sql_upper):
-            return "complex"
-    
-    for pattern in complexity_indicators["moderate"]:
-        if re.search(pattern, sql_upper):
-            return "moderate"
+    if _COMPLEX_QUERY_RE.search(sql_upper):
+        return "complex"
+    
+    if _MODERATE_QUERY_RE.search(sql_upper):
+        return "moderate"
     
     return "simple"
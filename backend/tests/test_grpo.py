@@ -99,6 +99,16 @@ def test_reward_functions():
     assert details["has_from"] == True
     print(f"  [OK] SQL validity reward: {score:.3f}")
     
+    # Quotes and parentheses inside literals don't count as syntax errors
+    score, details = rf.sql_validity_reward(
+        "SELECT name FROM customers WHERE last_name = \"O'Brien\" AND note = '(' -- isn't"
+    )
+    assert details["no_syntax_errors"] == True
+    assert details["balanced_parens"] == True
+    _, details = rf.sql_validity_reward("SELECT name FROM customers WHERE city = 'Paris")
+    assert details["no_syntax_errors"] == False
+    print("  [OK] SQL validity checks are literal-aware")
+    
     # Test invalid SQL
     score, details = rf.sql_validity_reward("")
     assert score < 0  # Empty SQL should have negative score
@@ -146,6 +156,24 @@ def test_reward_functions():
     assert "format_quality" in breakdown
     print(f"  [OK] Total reward: {total:.4f}")
     
+    # Test batch reward matches per-completion scoring
+    sqls = [
+        "SELECT category, COUNT(*) FROM products GROUP BY category",
+        "SELECT * FROM products",
+        "",
+    ]
+    totals, batch_breakdown = rf.compute_total_reward_batch(
+        sqls, "How many products per category?"
+    )
+    for i, sql in enumerate(sqls):
+        single_total, single_breakdown = rf.compute_total_reward(
+            sql=sql, question="How many products per category?"
+        )
+        assert abs(totals[i] - single_total) < 1e-9
+        for name, component in single_breakdown.items():
+            assert batch_breakdown[name]["scores"][i] == component["score"]
+    print(f"  [OK] Batch rewards: {totals.tolist()}")
+    
     print("[PASS] Reward function tests passed!\n")
 
 
@@ -182,13 +210,56 @@ def test_advantage_calculation():
         trainer2 = GRPOTrainer(config=config2, store=store)
         advantages2 = trainer2.compute_advantages(rewards)
         print(f"  [OK] Unscaled advantages: {[f'{a:.3f}' for a in advantages2]}")
-        
+
+        # Identical rewards give a zero-variance group with no advantage signal
+        flat_advantages = trainer.compute_advantages([0.4, 0.4, 0.4, 0.4])
+        assert flat_advantages == [0.0, 0.0, 0.0, 0.0]
+        print("  [OK] Zero-variance group yields zero advantages")
+
     finally:
         shutil.rmtree(temp_dir)
     
     print("[PASS] Advantage calculation tests passed!\n")
 
 
+def test_concurrent_execution_rewards():
+    """Test that executed completions are scored in order."""
+    print("Testing concurrent execution rewards...")
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        store = RLHFStore(storage_dir=temp_dir)
+        config = GRPOConfig(group_size=4, verbose=False, max_concurrent_executions=2)
+        trainer = GRPOTrainer(config=config, store=store)
+        
+        # Stub out Athena: queries on "missing" fail, everything else returns rows
+        def fake_execute(sql):
+            if "missing" in sql:
+                return None, "Table not found"
+            return {"total_rows": 5, "columns": ["id"]}, None
+        trainer._try_execute = fake_execute
+        
+        completions = [
+            "SELECT id FROM orders",
+            "SELECT id FROM missing",
+            "SELECT id FROM products",
+            "SELECT id FROM missing",
+        ]
+        results = trainer.compute_rewards(
+            completions, "List order ids", execute_queries=True
+        )
+        
+        exec_scores = [scores["execution_success"] for _, _, scores in results]
+        assert exec_scores[0] == 1.0 and exec_scores[2] == 1.0
+        assert exec_scores[1] < 0 and exec_scores[3] < 0
+        print(f"  [OK] Execution scores: {exec_scores}")
+        
+    finally:
+        shutil.rmtree(temp_dir)
+    
+    print("[PASS] Concurrent execution reward tests passed!\n")
+
+
 def test_grpo_training_step():
     """Test complete GRPO training step."""
     print("Testing GRPO training step...")
@@ -337,6 +408,7 @@ def run_all_tests():
         test_grpo_models()
         test_reward_functions()
         test_advantage_calculation()
+        test_concurrent_execution_rewards()
         test_grpo_training_step()
         test_policy_layer_updates()
         test_visualization_data()
@@ -83,6 +83,7 @@ def test_rlhf_store():
         all_feedback = store.get_all_feedback()
         assert len(all_feedback) == 1
         assert all_feedback[0].message_id == "msg-1"
+        assert all_feedback[0].metadata.tables == ("orders",)
         print("  [OK] Feedback loaded successfully")
         
         # Add more feedback for stats
@@ -109,6 +110,29 @@ def test_rlhf_store():
         assert len(orders_feedback) == 2
         print("  [OK] Table filtering works")
         
+        # Test message lookup
+        assert store.get_feedback_by_message_id("msg-2").id == record2.id
+        assert store.get_feedback_by_message_id("missing") is None
+        print("  [OK] Message lookup works")
+        
+        # Test pattern/table indexes and vote counts
+        join_feedback = store.get_feedback_by_sql_pattern("JOIN")
+        assert [r.message_id for r in join_feedback] == ["msg-2"]
+        assert store.get_pattern_feedback_counts("JOIN") == (0, 1)
+        assert store.get_table_feedback_counts("ORDERS") == (1, 1)
+        assert store.get_table_feedback_counts("unknown") == (0, 0)
+        print("  [OK] Pattern and table indexes work")
+        
+        # Test recency ordering and signature-based similar question lookup
+        assert [r.message_id for r in store.get_recent_feedback(2)] == ["msg-2", "msg-1"]
+        similar = store.get_recent_similar_feedback("show me customer orders", min_estimate=0.7)
+        assert [r.message_id for r in similar] == ["msg-2"]
+        similar_up = store.get_recent_similar_feedback(
+            "show me customer orders", feedback_type=FeedbackType.THUMBS_UP
+        )
+        assert [r.message_id for r in similar_up] == ["msg-1"]
+        print("  [OK] Recent similar feedback lookup works")
+        
         # Test policy hints
         hint = PolicyHint(
             hint_type="caution",
@@ -122,9 +146,18 @@ def test_rlhf_store():
         assert len(hints) == 1
         print("  [OK] Policy hints stored and retrieved")
         
-        # Verify file persistence
-        assert (Path(temp_dir) / "feedback_records.json").exists()
+        # Verify file persistence (feedback is an append-only JSON Lines log)
+        store.flush()
+        feedback_file = Path(temp_dir) / "feedback_records.jsonl"
+        assert feedback_file.exists()
+        assert len(feedback_file.read_text().splitlines()) == 2
         assert (Path(temp_dir) / "policy_state.json").exists()
+        reloaded = RLHFStore(storage_dir=temp_dir)
+        assert [r.message_id for r in reloaded.get_all_feedback()] == ["msg-1", "msg-2"]
+        
+        # Policy changes written by another store instance are picked up
+        store.add_policy_hint(PolicyHint(hint_type="tip", description="Filter by date", tables=["orders"]))
+        assert len(reloaded.get_hints_for_context(["orders"])) == 1
         print("  [OK] Data persisted to JSON files")
         
     finally:
@@ -169,6 +202,7 @@ def test_policy_engine():
             feedback_type=FeedbackType.THUMBS_UP
         )
         assert record.id is not None
+        assert record.question_shingle_bits != 0
         print("  [OK] Feedback recorded via engine")
         
         # Record negative feedback to trigger policy hints
@@ -201,6 +235,11 @@ def test_policy_engine():
         assert stats.total_feedback > 0
         print(f"  [OK] Stats: {stats.total_feedback} feedback, {stats.success_rate:.0%} success rate")
         
+        # Full analysis flags the failing tables, then only re-checks new feedback
+        assert engine.analyze_and_update_policies() == 2  # customers and orders
+        assert engine.analyze_and_update_policies() == 0
+        print("  [OK] Policy analysis only re-evaluates tables with new feedback")
+        
     finally:
         shutil.rmtree(temp_dir)
     
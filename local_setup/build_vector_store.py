@@ -2,17 +2,25 @@
 Build Local FAISS Vector Store
 
 This script creates a FAISS vector store from the schema documentation.
-Uses sentence-transformers for local embeddings (no AWS needed for this step).
+Uses sentence-transformers for local embeddings (no AWS needed for this step),
+or the backend's ONNX Runtime embedder when an ONNX export of the model exists.
 """
 
 import os
-import json
+import sys
+import hashlib
+import math
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import chain
 from pathlib import Path
 from typing import List, Dict
 
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import orjson
 
 # Configuration
 SCHEMA_DOCS_DIR = Path(__file__).parent / "schema_docs"
@@ -20,84 +28,339 @@ FAISS_INDEX_DIR = Path(__file__).parent / "faiss_index"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # Fast, good quality local model
 EMBEDDING_DIM = 384  # Dimension for all-MiniLM-L6-v2
 
+# FAISS index_factory string; empty picks one from the corpus size (see choose_index_factory)
+FAISS_INDEX_FACTORY = os.environ.get("FAISS_INDEX_FACTORY", "")
+
+# HNSW graph build breadth (for "HNSW32" or an IVF index's HNSW quantizer); the
+# query-time efSearch is set by the backend (FAISS_EF_SEARCH)
+FAISS_EF_CONSTRUCTION = int(os.environ.get("FAISS_EF_CONSTRUCTION", "200"))
+
+# OpenMP threads for training, adding and searching (same variable as the backend)
+FAISS_OMP_THREADS = int(os.environ.get("FAISS_OMP_THREADS", os.cpu_count() or 1))
+
+# ONNX export of EMBEDDING_MODEL (see README); used instead of PyTorch when present
+ONNX_MODEL_DIR = Path(os.environ.get("ONNX_MODEL_DIR", FAISS_INDEX_DIR / "onnx_model"))
+
+# Export EMBEDDING_MODEL to ONNX_MODEL_DIR (needs optimum) when it is missing
+EXPORT_ONNX_MODEL = os.environ.get("EXPORT_ONNX_MODEL", "false").lower() == "true"
+
+# sentence-transformers precision: "fp16" runs the model in half precision when
+# a CUDA GPU is available (embeddings are still stored as float32)
+EMBED_PRECISION = os.environ.get("EMBED_PRECISION", "fp32").lower()
+
+# Texts embedded per model call
+EMBEDDING_BATCH_SIZE = 256
+
+# Uncached chunks above which a PyTorch model is sharded over one process per
+# core; below it, worker start-up (each loads the model) costs more than it saves
+MULTI_PROCESS_MIN_TEXTS = 20_000
+
+# Embeddings of previously seen chunks, keyed by model and content hash; stored
+# as float16 (half the bytes, far below retrieval-relevant precision)
+EMBEDDING_CACHE_PATH = FAISS_INDEX_DIR / "embedding_cache.npz"
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+
+def _process_md_file(md_file: Path) -> List[Dict]:
+    """Split one schema documentation file into section chunks."""
+    with open(md_file, "r", encoding="utf-8") as f:
+        content = f.read()
+    
+    # Extract table name from filename
+    table_name = md_file.stem
+    
+    # Create document chunks
+    # Split by sections for better retrieval
+    sections = content.split("\n## ")
+    
+    documents = []
+    for i, section in enumerate(sections):
+        if i == 0:
+            # First section includes the title
+            chunk_content = section
+        else:
+            chunk_content = "## " + section
+        
+        if chunk_content.strip():
+            documents.append({
+                "content": chunk_content,
+                "metadata": {
+                    "source": str(md_file),
+                    "table": table_name,
+                    "section_index": i,
+                    "type": "schema"
+                }
+            })
+    return documents
+
 
 def load_schema_documents() -> List[Dict]:
     """Load all schema documentation files."""
-    documents = []
+    md_files = sorted(SCHEMA_DOCS_DIR.glob("*.md"))
     
-    for md_file in SCHEMA_DOCS_DIR.glob("*.md"):
-        with open(md_file, "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        # Extract table name from filename
-        table_name = md_file.stem
-        
-        # Create document chunks
-        # Split by sections for better retrieval
-        sections = content.split("\n## ")
-        
-        for i, section in enumerate(sections):
-            if i == 0:
-                # First section includes the title
-                chunk_content = section
-            else:
-                chunk_content = "## " + section
-            
-            if chunk_content.strip():
-                documents.append({
-                    "content": chunk_content,
-                    "metadata": {
-                        "source": str(md_file),
-                        "table": table_name,
-                        "section_index": i,
-                        "type": "schema"
-                    }
-                })
-    
-    print(f"Loaded {len(documents)} document chunks from {len(list(SCHEMA_DOCS_DIR.glob('*.md')))} files")
+    # Reading is I/O-bound, so threads overlap it without process start-up
+    # cost; map() keeps the chunks in file order
+    with ThreadPoolExecutor(max_workers=min(32, len(md_files) or 1)) as executor:
+        documents = list(chain.from_iterable(executor.map(_process_md_file, md_files)))
+    
+    print(f"Loaded {len(documents)} document chunks from {len(md_files)} files")
     return documents
 
 
-def create_embeddings(documents: List[Dict], model: SentenceTransformer) -> np.ndarray:
-    """Generate embeddings for all documents."""
+def export_onnx_model(model_dir: Path) -> bool:
+    """
+    Export EMBEDDING_MODEL to ONNX with a dynamically quantized int8 copy.
+    
+    Quantizing (and repacking the weights) once here means every later build
+    and the backend load a ready-to-run model. The export is written to a
+    temporary directory and moved into place, so a failed export never
+    leaves a partial model_dir behind.
+    
+    Returns:
+        True if model_dir now holds the exported model
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+    except ImportError as e:
+        print(f"Cannot export ONNX model ({e}); install optimum[onnxruntime]")
+        return False
+    
+    hub_id = f"sentence-transformers/{EMBEDDING_MODEL}"
+    print(f"Exporting {hub_id} to ONNX at {model_dir}...")
+    model_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f"{model_dir.name}.", suffix=".tmp", dir=model_dir.parent))
+    try:
+        ORTModelForFeatureExtraction.from_pretrained(hub_id, export=True).save_pretrained(tmp_dir)
+        AutoTokenizer.from_pretrained(hub_id).save_pretrained(tmp_dir)  # writes tokenizer.json
+        quantization = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        ORTQuantizer.from_pretrained(tmp_dir).quantize(save_dir=tmp_dir, quantization_config=quantization)
+        os.replace(tmp_dir, model_dir)
+    except Exception as e:
+        print(f"ONNX export failed: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+    return True
+
+
+def load_embedding_model():
+    """
+    Load the embedding model, preferring the ONNX export.
+    
+    Returns:
+        Tuple of (model, model_id, onnx_model_dir or None). The model has a
+        SentenceTransformer-style encode(); model_id names the model and
+        precision actually loaded, for keying the embedding cache.
+    """
+    if EXPORT_ONNX_MODEL and not ONNX_MODEL_DIR.is_dir():
+        export_onnx_model(ONNX_MODEL_DIR)
+    
+    if ONNX_MODEL_DIR.is_dir():
+        # Same embedder the backend uses for queries, so both sides match
+        sys.path.insert(0, str(BACKEND_DIR))
+        try:
+            from app.services.onnx_embedder import OnnxMiniLM
+            model = OnnxMiniLM(str(ONNX_MODEL_DIR))
+            print(f"Using ONNX embedding model from {ONNX_MODEL_DIR}")
+            return model, f"onnx:{ONNX_MODEL_DIR}", ONNX_MODEL_DIR
+        except (ImportError, FileNotFoundError) as e:
+            print(f"ONNX embedding model unavailable ({e}), using sentence-transformers")
+    
+    from sentence_transformers import SentenceTransformer
+    if EMBED_PRECISION == "fp16":
+        import torch
+        if torch.cuda.is_available():
+            print("Using sentence-transformers on CUDA in fp16")
+            model = SentenceTransformer(EMBEDDING_MODEL, device="cuda").half()
+            return model, f"{EMBEDDING_MODEL}:fp16", None
+        print("EMBED_PRECISION=fp16 needs a CUDA GPU, using fp32")
+    return SentenceTransformer(EMBEDDING_MODEL), EMBEDDING_MODEL, None
+
+
+def _embedding_key(model_id: str, content: str) -> str:
+    """Cache key for one chunk embedded by one model."""
+    return hashlib.blake2b(f"{model_id}\n{content}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def load_embedding_cache() -> Dict[str, np.ndarray]:
+    """Load cached embeddings, or an empty cache if there are none."""
+    if not EMBEDDING_CACHE_PATH.exists():
+        return {}
+    try:
+        with np.load(EMBEDDING_CACHE_PATH) as data:
+            return dict(zip(data["keys"].tolist(), data["vectors"].astype(np.float32)))
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Ignoring unreadable embedding cache: {e}")
+        return {}
+
+
+def save_embedding_cache(keys: List[str], vectors: np.ndarray):
+    """Save the embeddings of the current chunks (dropping stale entries)."""
+    FAISS_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = EMBEDDING_CACHE_PATH.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, keys=np.array(keys), vectors=vectors.astype(np.float16))
+    os.replace(tmp_path, EMBEDDING_CACHE_PATH)
+
+
+def _encode_multi_process(model, texts: List[str]) -> np.ndarray:
+    """Embed texts with a SentenceTransformer sharded over one process per core."""
+    pool = model.start_multi_process_pool()
+    try:
+        vectors = model.encode_multi_process(texts, pool, batch_size=EMBEDDING_BATCH_SIZE)
+    finally:
+        model.stop_multi_process_pool(pool)
+    print(f"  Embedded {len(texts)}/{len(texts)} across {len(pool['processes'])} processes")
+    
+    # encode_multi_process has no normalize_embeddings option
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def create_embeddings(documents: List[Dict], model, model_id: str = EMBEDDING_MODEL) -> np.ndarray:
+    """
+    Generate unit-length float32 embeddings for all documents.
+    
+    Chunks whose content was embedded by the same model on an earlier run
+    are read from the embedding cache; only new or changed chunks are run
+    through the model, once per distinct content. Cached vectors went
+    through float16, so their norms may be off from 1 by ~1e-4, far too
+    little to change rankings or threshold decisions.
+    """
     texts = [doc["content"] for doc in documents]
+    keys = [_embedding_key(model_id, text) for text in texts]
+    cache = load_embedding_cache()
     
-    print(f"Generating embeddings for {len(texts)} chunks...")
-    embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
+    embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    misses = []
+    first_miss = {}  # key -> index of the chunk that will be embedded for it
+    duplicates, originals = [], []  # repeated uncached chunks and their first copy
+    for i, key in enumerate(keys):
+        cached = cache.get(key)
+        if cached is not None and cached.shape == (EMBEDDING_DIM,):
+            embeddings[i] = cached
+        elif key in first_miss:
+            duplicates.append(i)
+            originals.append(first_miss[key])
+        else:
+            first_miss[key] = i
+            misses.append(i)
     
-    return embeddings.astype("float32")
+    # Batch texts of similar length together so little of each batch is padding
+    misses.sort(key=lambda i: len(texts[i]))
+    
+    print(
+        f"Generating embeddings for {len(misses)} chunks "
+        f"({len(texts) - len(misses) - len(duplicates)} cached, {len(duplicates)} duplicates)..."
+    )
+    if len(misses) >= MULTI_PROCESS_MIN_TEXTS and hasattr(model, "start_multi_process_pool"):
+        embeddings[misses] = _encode_multi_process(model, [texts[i] for i in misses])
+    else:
+        # SentenceTransformer.encode only disables gradients; inference mode
+        # also drops autograd's version-counter and view tracking per op
+        torch = sys.modules.get("torch")
+        is_torch_model = torch is not None and isinstance(model, torch.nn.Module)
+        with torch.inference_mode() if is_torch_model else nullcontext():
+            for start in range(0, len(misses), EMBEDDING_BATCH_SIZE):
+                batch = misses[start:start + EMBEDDING_BATCH_SIZE]
+                embeddings[batch] = model.encode(
+                    [texts[i] for i in batch], convert_to_numpy=True, normalize_embeddings=True
+                )
+                print(f"  Embedded {start + len(batch)}/{len(misses)}")
+    embeddings[duplicates] = embeddings[originals]
+    
+    if misses:
+        save_embedding_cache(keys, embeddings)
+    return embeddings
+
+
+def choose_index_factory(num_vectors: int) -> str:
+    """
+    Pick an index layout for the corpus size.
+    
+    Exact search is fastest for small corpora. Larger ones use an inverted
+    file with an HNSW coarse quantizer (about sqrt(N) lists, each needing
+    ~40 training points), adding OPQ + product quantization once raw vectors
+    no longer fit comfortably in cache.
+    
+    Set FAISS_INDEX_FACTORY=HNSW32 to force a graph index regardless.
+    """
+    if num_vectors < 10_000:
+        return "Flat"
+    nlist = int(math.sqrt(num_vectors))
+    if num_vectors < 1_000_000:
+        return f"IVF{nlist}_HNSW32,Flat"
+    return f"OPQ32_128,IVF{nlist}_HNSW32,PQ32"
 
 
-def build_faiss_index(embeddings: np.ndarray) -> faiss.IndexFlatIP:
-    """Build FAISS index with inner product similarity."""
+def _set_ef_construction(index: faiss.Index, ef_construction: int):
+    """Set the HNSW build breadth of the index itself or of its IVF quantizer."""
+    hnsw_index = index
+    try:
+        hnsw_index = faiss.downcast_index(faiss.extract_index_ivf(index).quantizer)
+    except RuntimeError:
+        pass  # Not an IVF index
+    if hasattr(hnsw_index, "hnsw"):
+        hnsw_index.hnsw.efConstruction = ef_construction
+
+
+def build_faiss_index(embeddings: np.ndarray, assume_normalized: bool = False) -> faiss.Index:
+    """
+    Build FAISS index with inner product similarity.
+    
+    float32 C-contiguous embeddings (as returned by create_embeddings) are
+    normalized in place rather than copied; other arrays are converted first
+    and left untouched.
+    
+    Args:
+        embeddings: Array of shape (num_vectors, EMBEDDING_DIM)
+        assume_normalized: Skip normalization for vectors that are already
+            unit length (create_embeddings output)
+    """
+    faiss.omp_set_num_threads(FAISS_OMP_THREADS)
+    
+    # FAISS's SIMD/BLAS kernels need C-contiguous float32; no copy if already so
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    
     # Normalize embeddings for cosine similarity via inner product
-    faiss.normalize_L2(embeddings)
+    if not assume_normalized:
+        faiss.normalize_L2(embeddings)
     
     # Create index
-    index = faiss.IndexFlatIP(EMBEDDING_DIM)
+    factory = FAISS_INDEX_FACTORY or choose_index_factory(len(embeddings))
+    index = faiss.index_factory(EMBEDDING_DIM, factory, faiss.METRIC_INNER_PRODUCT)
+    _set_ef_construction(index, FAISS_EF_CONSTRUCTION)
+    if not index.is_trained:
+        index.train(embeddings)
     index.add(embeddings)
     
-    print(f"Built FAISS index with {index.ntotal} vectors")
+    print(f"Built FAISS index ({factory}) with {index.ntotal} vectors")
     return index
 
 
-def save_index(index: faiss.IndexFlatIP, documents: List[Dict]):
+def save_index(index: faiss.Index, documents: List[Dict]):
     """Save FAISS index and document metadata."""
     FAISS_INDEX_DIR.mkdir(parents=True, exist_ok=True)
     
-    # Save FAISS index
+    # Save FAISS index. A running backend memory-maps index.faiss, so write a
+    # new file and rename it into place rather than overwriting the mapped one.
     index_path = FAISS_INDEX_DIR / "index.faiss"
-    faiss.write_index(index, str(index_path))
+    tmp_path = index_path.with_suffix(".faiss.tmp")
+    faiss.write_index(index, str(tmp_path))
+    os.replace(tmp_path, index_path)
     print(f"Saved FAISS index to {index_path}")
     
     # Save document metadata
     metadata_path = FAISS_INDEX_DIR / "documents.json"
-    with open(metadata_path, "w", encoding="utf-8") as f:
-        json.dump(documents, f, indent=2)
+    with open(metadata_path, "wb") as f:
+        f.write(orjson.dumps(documents, option=orjson.OPT_INDENT_2))
     print(f"Saved document metadata to {metadata_path}")
 
 
-def create_local_config():
+def create_local_config(onnx_model_dir=None):
     """Create local configuration file if it doesn't exist."""
     config_path = Path(__file__).parent / "local_config.json"
     
@@ -137,11 +400,11 @@ def create_local_config():
             "version": "1.0.0"
         }
         
-        with open(config_path, "w", encoding="utf-8") as f:
-            json.dump(config, f, indent=2)
+        with open(config_path, "wb") as f:
+            f.write(orjson.dumps(config, option=orjson.OPT_INDENT_2))
         print(f"Created local config at {config_path}")
     
-    # Create vector store config (always recreate - has paths)
+    # Create vector store config (kept in sync with the paths and model)
     vs_config = {
         "type": "faiss",
         "index_path": str(FAISS_INDEX_DIR / "index.faiss"),
@@ -151,10 +414,18 @@ def create_local_config():
         "top_k": 10,
         "similarity_threshold": 0.3
     }
+    if onnx_model_dir:
+        # Queries must be embedded by the same model as the index
+        vs_config["onnx_model_path"] = str(onnx_model_dir)
     
     vs_config_path = Path(__file__).parent / "vector_store_config.json"
-    with open(vs_config_path, "w", encoding="utf-8") as f:
-        json.dump(vs_config, f, indent=2)
+    content = orjson.dumps(vs_config, option=orjson.OPT_INDENT_2)
+    # Leave an unchanged file (and its mtime) alone for tools watching it
+    if vs_config_path.exists() and vs_config_path.read_bytes() == content:
+        print(f"Vector store config at {vs_config_path} is up to date")
+        return
+    with open(vs_config_path, "wb") as f:
+        f.write(content)
     print(f"Created vector store config at {vs_config_path}")
 
 
@@ -172,19 +443,19 @@ def main():
     
     # Load embedding model
     print(f"\nLoading embedding model: {EMBEDDING_MODEL}")
-    model = SentenceTransformer(EMBEDDING_MODEL)
+    model, model_id, onnx_model_dir = load_embedding_model()
     
     # Create embeddings
-    embeddings = create_embeddings(documents, model)
+    embeddings = create_embeddings(documents, model, model_id)
     
     # Build FAISS index
-    index = build_faiss_index(embeddings)
+    index = build_faiss_index(embeddings, assume_normalized=True)
     
     # Save everything
     save_index(index, documents)
     
     # Create local config
-    create_local_config()
+    create_local_config(onnx_model_dir)
     
     print("\n" + "=" * 60)
     print("Vector store built successfully!")